@@ -1,106 +1,1480 @@
 import os
-import feedparser
-import google.generativeai as genai
 from http.server import BaseHTTPRequestHandler
-import sib_api_v3_sdk
-from sib_api_v3_sdk.rest import ApiException
+from html.parser import HTMLParser
 from datetime import datetime, timedelta
 import re
+import json
+import sqlite3
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache, partial, wraps
 
-# --- Enhanced Core Functions ---
-def fetch_news_articles():
-    """Optimized RSS fetching with parallel processing for sub-30 second execution"""
-    import socket
+# --- Persistent State ---
+# Vercel only allows writes under /tmp, which survives between warm invocations
+STATE_DB_PATH = os.getenv("NEWS_STATE_DB", os.path.join(tempfile.gettempdir(), "ai_news_state.db"))
+
+STATE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS feed_cache (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        modified TEXT,
+        entries TEXT NOT NULL,
+        fetched_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS summary_cache (
+        key TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used ON summary_cache (last_used);
+    CREATE TABLE IF NOT EXISTS feed_health (
+        url TEXT PRIMARY KEY,
+        latencies TEXT NOT NULL,
+        outcomes TEXT NOT NULL,
+        consecutive_failures INTEGER NOT NULL,
+        last_success REAL,
+        open_until REAL
+    );
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        idempotency_key TEXT UNIQUE NOT NULL,
+        status TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        steps TEXT NOT NULL,
+        result TEXT,
+        error TEXT
+    );
+    CREATE TABLE IF NOT EXISTS articles (
+        id INTEGER PRIMARY KEY,
+        canonical_link TEXT UNIQUE NOT NULL,
+        title_hash TEXT NOT NULL,
+        title TEXT NOT NULL,
+        source TEXT,
+        first_fetched REAL NOT NULL,
+        last_fetched REAL NOT NULL,
+        summary TEXT,
+        sent_date TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_articles_title_hash ON articles (title_hash);
+    CREATE TABLE IF NOT EXISTS run_metrics (
+        trace_id TEXT PRIMARY KEY,
+        finished_at REAL NOT NULL,
+        metrics TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS digest_deliveries (
+        digest_date TEXT NOT NULL,
+        profile_id TEXT NOT NULL,
+        articles INTEGER NOT NULL,
+        sent_at REAL NOT NULL,
+        PRIMARY KEY (digest_date, profile_id)
+    );
+    CREATE TABLE IF NOT EXISTS summarizer_health (
+        backend TEXT PRIMARY KEY,
+        latencies TEXT NOT NULL,
+        outcomes TEXT NOT NULL,
+        consecutive_failures INTEGER NOT NULL,
+        last_failure REAL,
+        calls INTEGER NOT NULL,
+        prompt_tokens INTEGER NOT NULL,
+        reply_tokens INTEGER NOT NULL,
+        cost_usd REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS article_text (
+        url TEXT PRIMARY KEY,
+        text TEXT NOT NULL,
+        fetched_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS feed_snapshots (
+        url TEXT NOT NULL,
+        fetched_date TEXT NOT NULL,
+        entries TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (url, fetched_date)
+    );
+    CREATE INDEX IF NOT EXISTS idx_feed_snapshots_date ON feed_snapshots (fetched_date);
+"""
+
+def open_state_db():
+    """Open the shared SQLite state database, creating tables on first use"""
+    conn = sqlite3.connect(STATE_DB_PATH, timeout=10)
+    conn.executescript(STATE_SCHEMA)
+    return conn
+
+def load_feed_caches(urls):
+    """Return {url: cached feed} for every given feed that has a cache entry, in one query"""
+    if not urls:
+        return {}
+    
+    try:
+        conn = open_state_db()
+        try:
+            placeholders = ','.join('?' * len(urls))
+            rows = conn.execute(
+                f"SELECT url, etag, modified, entries FROM feed_cache WHERE url IN ({placeholders})", list(urls)
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Feed cache read failed: {e}")
+        return {}
+    
+    return {url: {'etag': etag, 'modified': modified, 'entries': json.loads(entries)}
+            for url, etag, modified, entries in rows}
+
+def save_feed_cache(url, etag, modified, entries):
+    """Store validators and parsed entries so unchanged feeds can be served on 304"""
     import time
-    from concurrent.futures import ThreadPoolExecutor, as_completed
     
-    start_time = time.time()
+    try:
+        conn = open_state_db()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO feed_cache (url, etag, modified, entries, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, etag, modified, json.dumps(entries), time.time())
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Feed cache write failed for {url}: {e}")
+
+# Each day's recent entries per feed, so past digests can be rebuilt (see replay_digests)
+FEED_SNAPSHOT_KEEP_DAYS = int(os.getenv("FEED_SNAPSHOT_KEEP_DAYS", "30"))
+
+def save_feed_snapshots(snapshots, fetched_date=None):
+    """Store {url: recent articles} as the feeds' snapshot for the date, in one transaction"""
+    import time
     
-    # Fast and reliable RSS feeds (6 sources for better coverage)
-    RSS_FEEDS = [
-        # Tier 1: Premium tech publications (fastest)
-        "https://www.technologyreview.com/tag/artificial-intelligence/feed/",
-        "https://venturebeat.com/category/ai/feed/",
-        "https://marktechpost.com/feed/",
-        
-        # Tier 2: Reliable and fast sources
-        "https://research.google/blog/rss/",  # Google Research - usually fast
-        "https://techcrunch.com/category/artificial-intelligence/feed/",  # TechCrunch AI
-        "https://www.artificialintelligence-news.com/feed/"  # AI News - dedicated AI site
-    ]
+    if not snapshots:
+        return
+    fetched_date = fetched_date or datetime.utcnow().date()
+    now = time.time()
+    rows = [(url, fetched_date.isoformat(), json.dumps([
+        {'title': article.title, 'link': article.link, 'summary': article.summary, 'date': article.date.isoformat()}
+        for article in articles
+    ]), now) for url, articles in snapshots.items()]
     
-    def fetch_single_feed(url):
-        """Fetch articles from single RSS feed with aggressive timeout"""
-        articles = []
-        original_timeout = socket.getdefaulttimeout()
+    try:
+        conn = open_state_db()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO feed_snapshots (url, fetched_date, entries, fetched_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                conn.execute("DELETE FROM feed_snapshots WHERE fetched_date < ?",
+                             ((fetched_date - timedelta(days=FEED_SNAPSHOT_KEEP_DAYS)).isoformat(),))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Feed snapshot write failed: {e}")
+
+def load_feed_snapshots(date_from, date_to):
+    """Return [(url, fetched date, entries)] for snapshots taken between the dates, in one query"""
+    try:
+        conn = open_state_db()
+        try:
+            rows = conn.execute(
+                "SELECT url, fetched_date, entries FROM feed_snapshots WHERE fetched_date BETWEEN ? AND ? "
+                "ORDER BY fetched_date, url", (date_from.isoformat(), date_to.isoformat())
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Feed snapshot read failed: {e}")
+        return []
+    
+    return [(url, datetime.strptime(fetched_date, "%Y-%m-%d").date(), json.loads(entries))
+            for url, fetched_date, entries in rows]
+
+# --- Tracing ---
+# Spans nest through a context variable, so a feed fetch on the fetch thread or a
+# Gemini call on a worker thread lands under the stage that started it (threads
+# and pools get the caller's context via with_trace_context). Finished runs are
+# exported as OpenTelemetry-style JSON lines and summarized into per-span
+# histograms that /metrics serves.
+TRACE_OUTPUT = os.getenv("TRACE_OUTPUT", "")  # "stdout", a JSON lines file path, or empty (metrics only)
+TRACE_HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+TRACE_SLOWEST_SPANS = 5  # Slowest spans kept per name in the metrics, with their attributes
+RUN_METRICS_KEEP = 20
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+class Span:
+    """One timed operation; `attributes` carries bytes, entries, tokens, retries, cache hits..."""
+    
+    __slots__ = ('name', 'trace', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'error')
+    
+    def __init__(self, name, trace=None, parent_id=None, attributes=None, start=None):
+        import time
         
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = start or time.time()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def duration_ms(self):
+        return ((self.end or self.start) - self.start) * 1000
+    
+    def to_otel(self):
+        """OTLP/JSON span field names, with attributes as a plain object"""
+        return {
+            'traceId': self.trace.trace_id if self.trace else None,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'name': self.name,
+            'startTimeUnixNano': int(self.start * 1e9),
+            'endTimeUnixNano': int((self.end or self.start) * 1e9),
+            'durationMs': round(self.duration_ms(), 3),
+            'attributes': self.attributes,
+            'status': {'code': 'STATUS_CODE_ERROR', 'message': self.error} if self.error
+                      else {'code': 'STATUS_CODE_OK'}
+        }
+
+class Trace:
+    """Spans collected for one pipeline run"""
+    
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self.lock = threading.Lock()
+    
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+@contextmanager
+def span(name, root=False, **attributes):
+    """Time a block as a child of the current span; `root=True` starts a new trace
+    
+    Outside any trace the span is timed but not recorded, so instrumented
+    functions cost next to nothing when called on their own.
+    """
+    import time
+    
+    parent = None if root else _current_span.get()
+    run_trace = Trace() if root else (parent.trace if parent else None)
+    current = Span(name, run_trace, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end = time.time()
+        if run_trace is not None:
+            run_trace.add(current)
+        if root:
+            finish_trace(run_trace)
+
+def traced(name, root=False):
+    """Decorator form of span() for a whole function call"""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, root=root):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def current_span():
+    """The innermost open span (a detached one outside any trace), for setting attributes"""
+    return _current_span.get() or Span('detached')
+
+def add_span(name, start, end, **attributes):
+    """Record an already-timed operation (e.g. work accumulated across many calls)"""
+    parent = _current_span.get()
+    if parent is None or parent.trace is None:
+        return
+    finished = Span(name, parent.trace, parent.span_id, attributes, start=start)
+    finished.end = end
+    parent.trace.add(finished)
+
+def with_trace_context(function):
+    """Bind `function` to a copy of the caller's context, for one run on another thread"""
+    return partial(contextvars.copy_context().run, function)
+
+def trace_metrics(run_trace):
+    """Per-span-name latency histograms (plus the slowest spans) for one finished trace"""
+    from collections import defaultdict
+    
+    spans_by_name = defaultdict(list)
+    root = None
+    for finished in run_trace.spans:
+        spans_by_name[finished.name].append(finished)
+        if finished.parent_id is None:
+            root = finished
+    
+    histograms = {}
+    for name, spans in spans_by_name.items():
+        durations = sorted(finished.duration_ms() for finished in spans)
+        buckets, index = {}, 0
+        for bound in TRACE_HISTOGRAM_BUCKETS_MS:
+            while index < len(durations) and durations[index] <= bound:
+                index += 1
+            buckets[str(bound)] = index
+        buckets['+Inf'] = len(durations)
+        slowest = sorted(spans, key=lambda finished: finished.duration_ms(), reverse=True)[:TRACE_SLOWEST_SPANS]
+        histograms[name] = {
+            'count': len(durations),
+            'errors': sum(1 for finished in spans if finished.error),
+            'sum_ms': round(sum(durations), 3),
+            'min_ms': round(durations[0], 3),
+            'p50_ms': round(percentile(durations, 0.5), 3),
+            'p95_ms': round(percentile(durations, 0.95), 3),
+            'max_ms': round(durations[-1], 3),
+            'buckets': buckets,
+            'slowest': [{'duration_ms': round(finished.duration_ms(), 3), 'attributes': finished.attributes,
+                         'error': finished.error} for finished in slowest]
+        }
+    
+    return {
+        'trace_id': run_trace.trace_id,
+        'name': root.name if root else None,
+        'started_at': datetime.utcfromtimestamp(root.start).isoformat() if root else None,
+        'duration_ms': round(root.duration_ms(), 3) if root else None,
+        'attributes': root.attributes if root else {},
+        'spans': len(run_trace.spans),
+        'histograms': histograms
+    }
+
+def finish_trace(run_trace):
+    """Export a finished trace as JSON lines (TRACE_OUTPUT) and save its metrics"""
+    import time
+    
+    try:
+        if TRACE_OUTPUT:
+            lines = "\n".join(json.dumps(finished.to_otel(), default=str) for finished in run_trace.spans)
+            if TRACE_OUTPUT == 'stdout':
+                print(lines)
+            else:
+                with open(TRACE_OUTPUT, 'a', encoding='utf-8') as trace_file:
+                    trace_file.write(lines + "\n")
+        
+        metrics = trace_metrics(run_trace)
+        conn = open_state_db()
         try:
-            socket.setdefaulttimeout(3)  # 3-second timeout per feed
-            feed = feedparser.parse(url)
-            
-            if not hasattr(feed, 'entries') or not feed.entries:
-                return articles
-                
-            today = datetime.utcnow().date()
-            two_days_ago = today - timedelta(days=2)
-            
-            # Process only first 6 entries per feed for speed
-            for entry in feed.entries[:6]:
-                article_date = None
-                if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                    try:
-                        article_date = datetime(*entry.published_parsed[:6]).date()
-                    except (TypeError, ValueError):
-                        continue
-                elif hasattr(entry, 'updated_parsed') and entry.updated_parsed:
-                    try:
-                        article_date = datetime(*entry.updated_parsed[:6]).date()
-                    except (TypeError, ValueError):
-                        continue
-                
-                if article_date and article_date >= two_days_ago:
-                    articles.append({
-                        'title': getattr(entry, 'title', 'No Title'),
-                        'link': getattr(entry, 'link', ''),
-                        'summary': getattr(entry, 'summary', '')[:300],
-                        'date': article_date,
-                        'source': extract_domain(url)
-                    })
-                    
-        except Exception as e:
-            print(f"Error fetching feed {url}: {e}")
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO run_metrics (trace_id, finished_at, metrics) VALUES (?, ?, ?)",
+                             (run_trace.trace_id, time.time(), json.dumps(metrics, default=str)))
+                conn.execute("DELETE FROM run_metrics WHERE trace_id NOT IN "
+                             "(SELECT trace_id FROM run_metrics ORDER BY finished_at DESC LIMIT ?)",
+                             (RUN_METRICS_KEEP,))
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Trace export failed: {e}")
+
+def load_run_metrics(trace_id=None):
+    """Metrics of the given run, or of the latest one"""
+    conn = open_state_db()
+    try:
+        if trace_id:
+            row = conn.execute("SELECT metrics FROM run_metrics WHERE trace_id = ?", (trace_id,)).fetchone()
+        else:
+            row = conn.execute("SELECT metrics FROM run_metrics ORDER BY finished_at DESC LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+def prometheus_metrics(metrics):
+    """Prometheus text exposition of one run's span histograms"""
+    def label(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    
+    lines = [
+        "# HELP ai_news_span_duration_ms Span durations of the latest pipeline run",
+        "# TYPE ai_news_span_duration_ms histogram"
+    ]
+    for name, histogram in sorted(metrics['histograms'].items()):
+        for bound, count in histogram['buckets'].items():
+            lines.append(f'ai_news_span_duration_ms_bucket{{span="{label(name)}",le="{bound}"}} {count}')
+        lines.append(f'ai_news_span_duration_ms_sum{{span="{label(name)}"}} {histogram["sum_ms"]}')
+        lines.append(f'ai_news_span_duration_ms_count{{span="{label(name)}"}} {histogram["count"]}')
+    lines.append("# HELP ai_news_span_errors Failed spans in the latest pipeline run")
+    lines.append("# TYPE ai_news_span_errors gauge")
+    for name, histogram in sorted(metrics['histograms'].items()):
+        lines.append(f'ai_news_span_errors{{span="{label(name)}"}} {histogram["errors"]}')
+    return "\n".join(lines) + "\n"
+
+# --- Summary Cache ---
+SUMMARY_PROMPT_VERSION = "v2"  # Bump whenever build_summary_prompt changes
+SUMMARY_CACHE_TTL_DAYS = int(os.getenv("SUMMARY_CACHE_TTL_DAYS", "7"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "2000"))
+
+def summary_cache_key(article, model_name):
+    """Content hash of everything that influences the generated summary"""
+    import hashlib
+    
+    normalized_title = re.sub(r'\s+', ' ', article.get('title', '').lower()).strip()
+    parts = [normalized_title, article.get('link', ''), article.get('summary', ''), SUMMARY_PROMPT_VERSION, model_name]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def load_cached_summaries(keys):
+    """Return {key: summary} for fresh cache entries among the given keys"""
+    import time
+    
+    if not keys:
+        return {}
+    
+    now = time.time()
+    cutoff = now - SUMMARY_CACHE_TTL_DAYS * 86400
+    try:
+        conn = open_state_db()
+        try:
+            placeholders = ','.join('?' * len(keys))
+            rows = conn.execute(
+                f"SELECT key, summary FROM summary_cache WHERE key IN ({placeholders}) AND created_at >= ?",
+                (*keys, cutoff)
+            ).fetchall()
+            if rows:
+                with conn:
+                    conn.executemany("UPDATE summary_cache SET last_used = ? WHERE key = ?",
+                                     [(now, key) for key, _ in rows])
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Summary cache read failed: {e}")
+        return {}
+    
+    return dict(rows)
+
+def save_cached_summaries(summaries):
+    """Store {key: summary} pairs, then drop expired and least recently used entries"""
+    import time
+    
+    if not summaries:
+        return
+    
+    now = time.time()
+    try:
+        conn = open_state_db()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO summary_cache (key, summary, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    [(key, summary, now, now) for key, summary in summaries.items()]
+                )
+                conn.execute("DELETE FROM summary_cache WHERE created_at < ?",
+                             (now - SUMMARY_CACHE_TTL_DAYS * 86400,))
+                conn.execute(
+                    "DELETE FROM summary_cache WHERE key NOT IN "
+                    "(SELECT key FROM summary_cache ORDER BY last_used DESC LIMIT ?)",
+                    (SUMMARY_CACHE_MAX_ENTRIES,)
+                )
         finally:
-            socket.setdefaulttimeout(original_timeout)
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Summary cache write failed: {e}")
+
+# --- Feed Registry ---
+# Feeds live in feeds.json at the project root: one {"url", "name"} object per feed
+# (set "enabled": false to pause one), plus domain -> name fallbacks for articles
+FEEDS_CONFIG_PATH = os.getenv(
+    "FEEDS_CONFIG", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "feeds.json")
+)
+
+def load_feed_registry(path=FEEDS_CONFIG_PATH):
+    """Load the feed list and source names from the JSON config file"""
+    with open(path, encoding='utf-8') as config_file:
+        config = json.load(config_file)
+    
+    feeds = [feed for feed in config.get('feeds', []) if feed.get('enabled', True)]
+    return feeds, config.get('source_names', {})
+
+FEED_REGISTRY, SOURCE_NAMES = load_feed_registry()
+RSS_FEEDS = [feed['url'] for feed in FEED_REGISTRY]
+FEED_NAMES = {feed['url']: feed['name'] for feed in FEED_REGISTRY if feed.get('name')}
+
+# --- Article Store ---
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|source)$', re.IGNORECASE)
+
+def canonical_link(link):
+    """Normalize a URL so the same article links compare equal across feeds and days"""
+    from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+    
+    try:
+        parts = urlsplit(link.strip())
+    except (AttributeError, ValueError):
+        return ''
+    if not parts.netloc:
+        return link.strip()
+    
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query) if not TRACKING_PARAMS.match(key)))
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return urlunsplit(('https', host, parts.path.rstrip('/') or '/', query, ''))
+
+def title_hash(title):
+    """Hash of the title as normalized by remove_duplicates"""
+    import hashlib
+    
+    normalized_title = re.sub(r'[^a-zA-Z0-9\s]', '', title.lower()).strip()
+    return hashlib.sha1(normalized_title.encode('utf-8')).hexdigest()
+
+@traced('store.filter_unsent')
+def filter_unsent_articles(articles, today=None):
+    """Record the fetch and drop articles already sent in an earlier day's digest
+    
+    Articles sent earlier *today* stay eligible, so forced re-sends still have content.
+    """
+    import time
+    
+    if not articles:
+        return []
+    
+    today = (today or datetime.utcnow().date()).isoformat()
+    now = time.time()
+    keyed = [(article, canonical_link(article.get('link', '')), title_hash(article['title'])) for article in articles]
+    
+    try:
+        conn = open_state_db()
+        try:
+            links = [link for _, link, _ in keyed if link]
+            hashes = [hashed for _, _, hashed in keyed]
+            rows = conn.execute(
+                f"SELECT canonical_link, title_hash FROM articles WHERE sent_date < ? AND "
+                f"(canonical_link IN ({','.join('?' * len(links))}) OR title_hash IN ({','.join('?' * len(hashes))}))",
+                (today, *links, *hashes)
+            ).fetchall()
+            sent_links = {row[0] for row in rows}
+            sent_hashes = {row[1] for row in rows}
             
+            with conn:
+                conn.executemany(
+                    "INSERT INTO articles (canonical_link, title_hash, title, source, first_fetched, last_fetched) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(canonical_link) DO UPDATE SET last_fetched = excluded.last_fetched",
+                    [(link, hashed, article['title'], article.get('source'), now, now)
+                     for article, link, hashed in keyed if link]
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Article store read failed: {e}")
         return articles
     
-    all_articles = []
+    unsent = [article for article, link, hashed in keyed
+              if (not link or link not in sent_links) and hashed not in sent_hashes]
+    current_span().set(articles_in=len(articles), unsent=len(unsent))
+    return unsent
+
+@traced('store.record_sent')
+def record_sent_articles(articles, sent_date=None):
+    """Store the summaries of a delivered digest and mark its articles as sent"""
+    import time
+    
+    sent_date = (sent_date or datetime.utcnow().date()).isoformat()
+    now = time.time()
+    rows = [(canonical_link(article.get('link', '')), title_hash(article['title']), article['title'],
+             article.get('source'), now, now, article.get('ai_summary'), sent_date)
+            for article in articles]
     
-    # Parallel RSS fetching with 15-second total timeout for 6 feeds
     try:
-        with ThreadPoolExecutor(max_workers=6) as executor:
-            future_to_url = {executor.submit(fetch_single_feed, url): url for url in RSS_FEEDS}
+        conn = open_state_db()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO articles (canonical_link, title_hash, title, source, first_fetched, last_fetched, "
+                    "summary, sent_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(canonical_link) DO UPDATE SET summary = excluded.summary, "
+                    "sent_date = COALESCE(articles.sent_date, excluded.sent_date)",
+                    [row for row in rows if row[0]]
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Article store write failed: {e}")
+
+# --- Digest Archive ---
+# Kept in its own file so it can live on longer-lived storage than the /tmp caches;
+# api/search.py reads the same file
+DIGEST_ARCHIVE_DB_PATH = os.getenv("DIGEST_ARCHIVE_DB", STATE_DB_PATH)
+
+DIGEST_ARCHIVE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS digest_archive (
+        id INTEGER PRIMARY KEY,
+        digest_date TEXT NOT NULL,
+        source TEXT NOT NULL,
+        title TEXT NOT NULL,
+        link TEXT NOT NULL,
+        published TEXT,
+        summary TEXT,
+        UNIQUE (digest_date, link)
+    );
+    CREATE INDEX IF NOT EXISTS idx_digest_archive_date ON digest_archive (digest_date, source);
+    CREATE INDEX IF NOT EXISTS idx_digest_archive_source_date ON digest_archive (source, digest_date);
+    CREATE VIRTUAL TABLE IF NOT EXISTS digest_archive_fts USING fts5 (
+        title, summary, source UNINDEXED, content='digest_archive', content_rowid='id'
+    );
+    CREATE TRIGGER IF NOT EXISTS digest_archive_ai AFTER INSERT ON digest_archive BEGIN
+        INSERT INTO digest_archive_fts (rowid, title, summary, source) VALUES (new.id, new.title, new.summary, new.source);
+    END;
+    CREATE TRIGGER IF NOT EXISTS digest_archive_ad AFTER DELETE ON digest_archive BEGIN
+        INSERT INTO digest_archive_fts (digest_archive_fts, rowid, title, summary, source)
+        VALUES ('delete', old.id, old.title, old.summary, old.source);
+    END;
+"""
+
+@traced('archive.write')
+def archive_digest(articles, digest_date=None):
+    """Persist a delivered digest into the full-text searchable archive"""
+    digest_date = (digest_date or datetime.utcnow().date()).isoformat()
+    rows = []
+    for article in articles:
+        published = article.get('date')
+        rows.append((
+            digest_date,
+            article.get('source', 'Unknown Source'),
+            article['title'],
+            article.get('link', ''),
+            published.isoformat() if hasattr(published, 'isoformat') else published,
+            article.get('ai_summary') or article.get('summary', '')
+        ))
+    
+    try:
+        conn = sqlite3.connect(DIGEST_ARCHIVE_DB_PATH, timeout=10)
+        try:
+            conn.executescript(DIGEST_ARCHIVE_SCHEMA)
+            with conn:
+                # Delete first (firing the FTS delete trigger) so re-sent days don't duplicate index rows
+                conn.executemany("DELETE FROM digest_archive WHERE digest_date = ? AND link = ?",
+                                 [(row[0], row[3]) for row in rows])
+                conn.executemany(
+                    "INSERT INTO digest_archive (digest_date, source, title, link, published, summary) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Digest archive write failed: {e}")
+
+# --- Enhanced Core Functions ---
+FEED_FETCH_TIMEOUT = 15  # Overall budget for all feeds, in seconds
+FEED_CONNECT_TIMEOUT = 3  # Per-request connect timeout, in seconds
+FEED_READ_TIMEOUT = 3  # Per-request socket read timeout, in seconds
+FEED_CONCURRENCY = int(os.getenv("FEED_CONCURRENCY", "50"))  # Feeds in flight across all hosts
+FEED_PER_HOST_LIMIT = int(os.getenv("FEED_PER_HOST_LIMIT", "4"))  # Feeds in flight per host
+FEED_USER_AGENT = "Mozilla/5.0 (compatible; AI-News-Automation/1.0)"
+ARTICLE_QUEUE_SIZE = 32  # Bounded hand-off between feed fetchers and the summarizer
+
+FEED_MAX_ENTRIES = int(os.getenv("FEED_MAX_ENTRIES", "6"))  # Recent entries kept per feed
+FEED_MAX_AGE_DAYS = 2  # Entries older than this are dropped
+FEED_OLD_ENTRIES_TO_STOP = 3  # Consecutive old entries that end the parse; a pinned or out-of-order one doesn't
+FEED_MAX_BYTES = int(os.getenv("FEED_MAX_BYTES", str(1024 * 1024)))  # Rest of a feed is not downloaded
+
+class Article:
+    """One story as it moves through the pipeline
+    
+    Slots keep the per-article footprint small and make each stage fill in its own
+    field (source, also_covered_by, relevance_score, ai_summary) on the same record
+    instead of copying it. Item access works as on the dicts the stages were
+    written against, so callers may still pass plain dicts.
+    """
+    __slots__ = ('title', 'link', 'summary', 'date', 'source', 'also_covered_by', 'relevance_score', 'ai_summary')
+    
+    def __init__(self, title, link, summary='', date=None, source=None):
+        self.title = title
+        self.link = link
+        self.summary = summary
+        self.date = date
+        self.source = source
+    
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+    
+    def __contains__(self, key):
+        return hasattr(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+    
+    def setdefault(self, key, default=None):
+        if not hasattr(self, key):
+            setattr(self, key, default)
+        return getattr(self, key)
+    
+    def __repr__(self):
+        return f"Article({self.title!r}, {self.link!r})"
+
+def feed_cutoff_date(today=None):
+    """Oldest publish date still considered for a digest"""
+    return (today or datetime.utcnow().date()) - timedelta(days=FEED_MAX_AGE_DAYS)
+
+def parse_entry_date(entry):
+    """Return a feedparser entry's publish (or update) date as ISO string, or None"""
+    for field in ('published_parsed', 'updated_parsed'):
+        parsed = getattr(entry, field, None)
+        if parsed:
+            try:
+                return datetime(*parsed[:6]).date().isoformat()
+            except (TypeError, ValueError):
+                return None
+    return None
+
+def parse_feed_date(text):
+    """UTC date (ISO string) of an RSS (RFC 822) or Atom (ISO 8601) timestamp, or None"""
+    from datetime import timezone
+    from email.utils import parsedate_to_datetime
+    
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        parsed = parsedate_to_datetime(text)
+    except (TypeError, ValueError, IndexError):
+        parsed = None
+    if parsed is None:
+        try:
+            parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            # Odd fractional seconds or offsets: the calendar date is all that's used
+            match = re.match(r'(\d{4})-(\d{2})-(\d{2})', text)
+            try:
+                return datetime(*map(int, match.groups())).date().isoformat() if match else None
+            except ValueError:
+                return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.date().isoformat()
+
+def xml_local_name(tag):
+    """Element name without its namespace ('{http://www.w3.org/2005/Atom}entry' -> 'entry')"""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+class FeedStreamParser:
+    """Incremental RSS/Atom parser for a feed body that arrives in chunks
+    
+    Each <item>/<entry> is reduced to the fields the pipeline uses as soon as it
+    closes, then cleared from the tree. `feed()` returns True once reading can
+    stop: FEED_MAX_ENTRIES recent entries were found, FEED_OLD_ENTRIES_TO_STOP
+    entries in a row were older than `cutoff` (feeds list newest first, give or
+    take a pinned post), or FEED_MAX_BYTES were read.
+    Markup the XML parser rejects, such as undeclared HTML entities or an
+    encoding expat doesn't know, sets `failed`; the bytes read so far are kept
+    for the feedparser fallback.
+    """
+    ENTRY_TAGS = frozenset(('item', 'entry'))
+    SUMMARY_FIELDS = ('description', 'summary', 'content', 'encoded')
+    DATE_FIELDS = ('pubDate', 'published', 'updated', 'date')
+    
+    def __init__(self, cutoff=None, max_entries=FEED_MAX_ENTRIES, max_bytes=FEED_MAX_BYTES):
+        from xml.etree.ElementTree import XMLPullParser
+        
+        self.parser = XMLPullParser(events=('end',))
+        self.cutoff = cutoff.isoformat() if cutoff else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self.size = 0
+        self.entries = []
+        self.old_entries = 0  # Consecutive entries older than the cutoff
+        self.stopped = None  # 'max_entries', 'cutoff' or 'byte_cap' once parsing stopped early
+        self.failed = False
+    
+    def feed(self, chunk):
+        """Parse another chunk; returns True when the rest of the feed isn't needed"""
+        if self.stopped:
+            return True
+        capped = self.size + len(chunk) > self.max_bytes
+        chunk = chunk[:self.max_bytes - self.size]
+        self.size += len(chunk)
+        self.chunks.append(chunk)
+        
+        if not self.failed:
+            from xml.etree.ElementTree import ParseError
+            try:
+                self.parser.feed(chunk)
+                for _, element in self.parser.read_events():
+                    if xml_local_name(element.tag) in self.ENTRY_TAGS:
+                        self.add_entry(element)
+                        element.clear()
+                        if self.stopped:
+                            return True
+            except ParseError:
+                self.failed = True
+        if capped:
+            self.stopped = 'byte_cap'
+        return bool(self.stopped)
+    
+    def close(self):
+        """Finish after the last chunk; a document cut off by an early stop is not an error"""
+        from xml.etree.ElementTree import ParseError
+        
+        if not self.failed and not self.stopped:
+            try:
+                self.parser.close()
+                for _, element in self.parser.read_events():
+                    if xml_local_name(element.tag) in self.ENTRY_TAGS and not self.stopped:
+                        self.add_entry(element)
+            except ParseError:
+                self.failed = not self.entries
+        return self
+    
+    def body(self):
+        return b''.join(self.chunks)
+    
+    def add_entry(self, element):
+        import html
+        
+        fields = {}
+        link = None
+        for child in element:
+            name = xml_local_name(child.tag)
+            if name == 'link':
+                # RSS puts the URL in the text, Atom in href (rel="alternate" or no rel)
+                href = child.get('href')
+                if href is None:
+                    link = link or (child.text or '').strip()
+                elif child.get('rel', 'alternate') == 'alternate':
+                    link = link or href.strip()
+            elif name not in fields:
+                fields[name] = ''.join(child.itertext())
+                if name == 'title' and child.get('type') in ('html', 'xhtml'):
+                    fields[name] = clean_html_text(fields[name])
+        
+        entry_date = next((parse_feed_date(fields[name]) for name in self.DATE_FIELDS if fields.get(name)), None)
+        if not entry_date:
+            return
+        if self.cutoff and entry_date < self.cutoff:
+            self.old_entries += 1
+            if self.old_entries >= FEED_OLD_ENTRIES_TO_STOP:
+                self.stopped = 'cutoff'
+            return
+        self.old_entries = 0
+        summary = next((fields[name] for name in self.SUMMARY_FIELDS if fields.get(name)), '')
+        self.entries.append({
+            'title': re.sub(r'\s+', ' ', html.unescape(fields.get('title', ''))).strip() or 'No Title',
+            'link': link or '',
+            # Feeds often put HTML in the summary; a trailing cut-off tag is dropped too
+            'summary': clean_html_text(summary[:2000])[:300],
+            'date': entry_date
+        })
+        if len(self.entries) >= self.max_entries:
+            self.stopped = 'max_entries'
+
+def parse_feed_fallback(body, response_headers, cutoff):
+    """Entries from feedparser, for feeds the incremental XML parser rejects"""
+    import feedparser
+    
+    entries = []
+    old_entries = 0
+    for entry in feedparser.parse(body, response_headers=dict(response_headers or {})).entries:
+        entry_date = parse_entry_date(entry)
+        if not entry_date:
+            continue
+        if entry_date < cutoff.isoformat():
+            old_entries += 1
+            if old_entries >= FEED_OLD_ENTRIES_TO_STOP:
+                break
+            continue
+        old_entries = 0
+        entries.append({
+            'title': getattr(entry, 'title', 'No Title'),
+            'link': getattr(entry, 'link', ''),
+            'summary': clean_html_text(getattr(entry, 'summary', '')[:2000])[:300],
+            'date': entry_date
+        })
+        if len(entries) >= FEED_MAX_ENTRIES:
+            break
+    return entries
+
+@traced('feed.parse')
+def parse_feed_response(url, status, response_headers, body, cached=None):
+    """Turn a feed response (or a 304 against `cached`) into recent Article records
+    
+    `body` is the raw feed, or the FeedStreamParser that already read it while it
+    downloaded. feedparser only runs when the incremental parser fails.
+    """
+    cutoff = feed_cutoff_date()
+    stream = body if isinstance(body, FeedStreamParser) else None
+    parse_span = current_span()
+    parse_span.set(bytes=stream.size if stream else len(body or b''), not_modified=bool(cached and status == 304))
+    if cached and status == 304:
+        entries = cached['entries']
+    else:
+        if status >= 400:
+            raise IOError(f"HTTP {status}")
+        
+        if stream is None:
+            stream = FeedStreamParser(cutoff)
+            stream.feed(body or b'')
+        stream.close()
+        if stream.failed:
+            entries = parse_feed_fallback(stream.body(), response_headers, cutoff)
+        else:
+            entries = stream.entries
+        parse_span.set(parser='feedparser' if stream.failed else 'stream', stopped=stream.stopped or 'end')
+        
+        etag, modified = response_headers.get('ETag'), response_headers.get('Last-Modified')
+        if etag or modified:
+            save_feed_cache(url, etag, modified, entries)
+    
+    articles = recent_articles(entries, extract_domain(url))
+    parse_span.set(entries=len(entries), recent=len(articles))
+    return articles
+
+def recent_articles(entries, source, today=None):
+    """Article records for the cached entries inside the digest window ending `today`
+    
+    Replaying a past day also leaves out entries dated after that day.
+    """
+    cutoff = feed_cutoff_date(today)
+    articles = []
+    for entry in entries:
+        if not entry['date']:
+            continue
+        article_date = datetime.strptime(entry['date'], "%Y-%m-%d").date()
+        if article_date >= cutoff and (today is None or article_date <= today):
+            articles.append(Article(entry['title'], entry['link'], entry['summary'], article_date, source))
+    return articles
+
+async def fetch_feeds_async(urls, deliver, deadline, cancelled):
+    """Asyncio fetch engine: global and per-host concurrency caps, hard deadline
+    
+    Feeds with an open circuit breaker are skipped, every other feed gets a timeout
+    adapted to its latency history, and outcomes are recorded in feed_health.
+    Each feed's articles are parsed off the event loop and passed to `deliver`
+    (which may block for backpressure) as soon as that feed completes. Feeds still
+    running at the deadline, or when `cancelled` is set, are cancelled outright.
+    """
+    import asyncio
+    import time
+    from collections import defaultdict
+    from urllib.parse import urlparse
+    import httpx
+    
+    cached_feeds = await asyncio.to_thread(load_feed_caches, urls)
+    health = await asyncio.to_thread(load_feed_health, urls)
+    results = {}  # url -> (succeeded, latency) for this run
+    snapshots = {}  # url -> recent articles, kept for replays
+    
+    # Circuit breaker: skip feeds that keep failing until their cooldown expires
+    now = time.time()
+    skipped = [url for url in urls if circuit_open(health.get(url), now)]
+    if skipped:
+        print(f"Skipping {len(skipped)} feeds with open circuit: {', '.join(extract_domain(url) for url in skipped)}")
+    urls = [url for url in urls if url not in skipped]
+    current_span().set(feeds=len(urls), skipped_open_circuit=len(skipped))
+    
+    global_limit = asyncio.Semaphore(max(1, FEED_CONCURRENCY))
+    host_limits = defaultdict(lambda: asyncio.Semaphore(max(1, FEED_PER_HOST_LIMIT)))
+    
+    limits = httpx.Limits(max_connections=max(1, FEED_CONCURRENCY), max_keepalive_connections=max(1, FEED_CONCURRENCY))
+    
+    async with httpx.AsyncClient(limits=limits, follow_redirects=True,
+                                 headers={'User-Agent': FEED_USER_AGENT}) as client:
+        
+        async def fetch_feed(url):
+            cached = cached_feeds.get(url)
+            
+            # Conditional GET: unchanged feeds answer 304 with an empty body
+            request_headers = {}
+            if cached and cached['etag']:
+                request_headers['If-None-Match'] = cached['etag']
+            if cached and cached['modified']:
+                request_headers['If-Modified-Since'] = cached['modified']
+            
+            # Each feed's timeout follows its own latency history
+            read_timeout = adaptive_feed_timeout(health.get(url))
+            timeout = httpx.Timeout(connect=FEED_CONNECT_TIMEOUT, read=read_timeout, write=read_timeout, pool=None)
+            started = None
+            queued = time.time()
+            stream = FeedStreamParser(feed_cutoff_date())
             
-            for future in as_completed(future_to_url, timeout=15):
+            async def read_feed():
+                """GET the feed, parsing while it downloads; stops reading once the parser has enough"""
+                async with client.stream('GET', url, headers=request_headers, timeout=timeout) as response:
+                    if 200 <= response.status_code < 300:
+                        async for chunk in response.aiter_bytes():
+                            if stream.feed(chunk):
+                                break
+                    return response
+            
+            with span('feed.fetch', url=url, timeout_s=read_timeout, conditional=bool(request_headers)) as feed_span:
                 try:
-                    articles = future.result()
-                    all_articles.extend(articles)
-                except Exception as e:
-                    print(f"Feed fetch exception: {e}")
+                    async with global_limit, host_limits[urlparse(url).netloc]:
+                        started = time.time()
+                        feed_span.set(queue_wait_ms=round((started - queued) * 1000, 1))
+                        response = await asyncio.wait_for(read_feed(), FEED_CONNECT_TIMEOUT + read_timeout)
+                        latency = time.time() - started
+                    feed_span.set(status=response.status_code, bytes=stream.size, stopped=stream.stopped,
+                                  latency_ms=round(latency * 1000, 1))
                     
-    except Exception as e:
-        print(f"Parallel fetch timeout or error: {e}")
+                    # Entries were parsed as they arrived; the feedparser fallback and the
+                    # cache write still happen off the event loop
+                    articles = await asyncio.to_thread(
+                        parse_feed_response, url, response.status_code, response.headers, stream, cached
+                    )
+                    feed_span.set(articles=len(articles))
+                    results[url] = (True, latency)
+                    snapshots[url] = articles
+                    await asyncio.to_thread(deliver, articles)
+                except asyncio.CancelledError:
+                    # Hitting the run deadline counts against the feed; the consumer
+                    # stopping early because it has enough articles does not
+                    if started is not None and url not in results and not cancelled.is_set():
+                        results[url] = (False, time.time() - started)
+                    raise
+                except Exception as e:
+                    if url not in results:
+                        results[url] = (False, time.time() - started if started else None)
+                    feed_span.error = f"{type(e).__name__}: {e}"[:300]
+                    print(f"Error fetching feed {url}: {e}")
+        
+        async def wait_for_cancel():
+            while not cancelled.is_set():
+                await asyncio.sleep(0.1)
+        
+        tasks = [asyncio.create_task(fetch_feed(url)) for url in urls]
+        all_feeds = asyncio.gather(*tasks, return_exceptions=True)
+        watcher = asyncio.create_task(wait_for_cancel())
+        
+        done, _ = await asyncio.wait({all_feeds, watcher}, timeout=max(0, deadline - time.time()),
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if all_feeds not in done and not cancelled.is_set():
+            print(f"Parallel fetch timeout: {sum(not task.done() for task in tasks)} feeds still pending")
+        
+        # Cancel stragglers rather than leaving them running past the deadline
+        for task in tasks + [watcher]:
+            task.cancel()
+        await asyncio.gather(*tasks, watcher, return_exceptions=True)
+    
+    await asyncio.to_thread(record_feed_health, health, results)
+    await asyncio.to_thread(save_feed_snapshots, snapshots)
+
+# --- Feed Health ---
+FEED_HEALTH_SAMPLES = 20  # Recent fetches kept per feed for latency/error statistics
+FEED_MIN_TIMEOUT = 2.0  # Adaptive timeout bounds, in seconds
+FEED_MAX_TIMEOUT = 8.0
+FEED_BREAKER_THRESHOLD = 3  # Consecutive failures before a feed is skipped
+FEED_BREAKER_COOLDOWN = 3600  # First re-probe delay in seconds, doubled per further failure (max 1 day)
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def load_feed_health(urls):
+    """Return {url: health record} for the given feeds"""
+    if not urls:
+        return {}
+    
+    try:
+        conn = open_state_db()
+        try:
+            placeholders = ','.join('?' * len(urls))
+            rows = conn.execute(
+                "SELECT url, latencies, outcomes, consecutive_failures, last_success, open_until "
+                f"FROM feed_health WHERE url IN ({placeholders})", list(urls)
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Feed health read failed: {e}")
+        return {}
+    
+    return {url: {
+        'latencies': json.loads(latencies),
+        'outcomes': json.loads(outcomes),
+        'consecutive_failures': consecutive_failures,
+        'last_success': last_success,
+        'open_until': open_until
+    } for url, latencies, outcomes, consecutive_failures, last_success, open_until in rows}
+
+def record_feed_health(health, results):
+    """Fold this run's {url: (succeeded, latency)} into the stored health records"""
+    import time
     
-    # Quick deduplication
-    unique_articles = remove_duplicates(all_articles)
+    now = time.time()
+    updates = []
+    for url, (succeeded, latency) in results.items():
+        record = health.get(url) or {'latencies': [], 'outcomes': [], 'consecutive_failures': 0,
+                                     'last_success': None, 'open_until': None}
+        if latency is not None:
+            record['latencies'] = (record['latencies'] + [round(latency, 3)])[-FEED_HEALTH_SAMPLES:]
+        record['outcomes'] = (record['outcomes'] + [1 if succeeded else 0])[-FEED_HEALTH_SAMPLES:]
+        
+        if succeeded:
+            record['consecutive_failures'] = 0
+            record['last_success'] = now
+            record['open_until'] = None
+        else:
+            record['consecutive_failures'] += 1
+            excess = record['consecutive_failures'] - FEED_BREAKER_THRESHOLD
+            if excess >= 0:
+                record['open_until'] = now + min(FEED_BREAKER_COOLDOWN * 2 ** excess, 86400)
+        
+        updates.append((url, json.dumps(record['latencies']), json.dumps(record['outcomes']),
+                        record['consecutive_failures'], record['last_success'], record['open_until']))
     
-    fetch_time = time.time() - start_time
-    print(f"RSS fetch completed in {fetch_time:.2f}s with {len(unique_articles)} articles")
+    try:
+        conn = open_state_db()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO feed_health "
+                    "(url, latencies, outcomes, consecutive_failures, last_success, open_until) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", updates
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Feed health write failed: {e}")
+
+def circuit_open(record, now):
+    """True while a failing feed is cooling down; after that it gets one re-probe"""
+    return bool(record and record['open_until'] and record['open_until'] > now)
+
+def adaptive_feed_timeout(record):
+    """Read timeout sized from the feed's own p95 latency, within fixed bounds"""
+    if not record or len(record['latencies']) < 3:
+        return FEED_READ_TIMEOUT
+    return min(FEED_MAX_TIMEOUT, max(FEED_MIN_TIMEOUT, percentile(record['latencies'], 0.95) * 2))
+
+def feed_health_report():
+    """Per-feed latency, error rate and circuit state for the /test endpoint"""
+    import time
+    
+    now = time.time()
+    health = load_feed_health(RSS_FEEDS)
+    report = []
+    for url in RSS_FEEDS:
+        record = health.get(url)
+        latencies = record['latencies'] if record else []
+        outcomes = record['outcomes'] if record else []
+        report.append({
+            'name': extract_domain(url),
+            'url': url,
+            'p50_latency_s': percentile(latencies, 0.5) if latencies else None,
+            'p95_latency_s': percentile(latencies, 0.95) if latencies else None,
+            'error_rate': round(1 - sum(outcomes) / len(outcomes), 3) if outcomes else None,
+            'last_success': datetime.utcfromtimestamp(record['last_success']).isoformat()
+                            if record and record['last_success'] else None,
+            'timeout_s': round(adaptive_feed_timeout(record), 2),
+            'circuit': 'open' if circuit_open(record, now) else 'closed'
+        })
     
-    return unique_articles[:18]  # Limit to 18 articles for processing (6 feeds × 3 articles avg)
+    # Slowest feeds first, so the sources dragging out the daily run stand out
+    return sorted(report, key=lambda feed: feed['p95_latency_s'] or 0, reverse=True)
+
+# --- Relevance Ranking ---
+# Weights and the topic profile live in the "ranking" block of feeds.json;
+# per-feed "weight" values set source weight (default 1.0)
+RANKING_ENABLED = os.getenv("RANKING_ENABLED", "1") == "1"
+DEFAULT_RANKING = {
+    'topic_profile': "",
+    'weights': {'recency': 0.3, 'relevance': 0.4, 'source': 0.15, 'coverage': 0.15},
+    'recency_half_life_days': 1.0
+}
+
+def load_ranking_config(path=FEEDS_CONFIG_PATH):
+    """Ranking settings from the feed config, over the defaults"""
+    with open(path, encoding='utf-8') as config_file:
+        ranking = json.load(config_file).get('ranking', {})
+    return {
+        'topic_profile': ranking.get('topic_profile', DEFAULT_RANKING['topic_profile']),
+        'weights': {**DEFAULT_RANKING['weights'], **ranking.get('weights', {})},
+        'recency_half_life_days': ranking.get('recency_half_life_days', DEFAULT_RANKING['recency_half_life_days'])
+    }
+
+RANKING_CONFIG = load_ranking_config()
+SOURCE_WEIGHTS = {feed['name']: float(feed.get('weight', 1.0)) for feed in FEED_REGISTRY if feed.get('name')}
+
+def rank_tokens(text):
+    """Lowercased content words, without markup or stopwords"""
+    return [word for word in re.findall(r'[a-z0-9]+', re.sub(r'<[^>]+>', ' ', text.lower()))
+            if word not in SHINGLE_STOPWORDS and len(word) > 1]
+
+@traced('rank')
+def rank_articles(articles, top_k=None, config=None, today=None):
+    """Score all candidates in one vectorized pass and return the best first
+    
+    The score is a weighted sum of recency (exponential decay by age), TF-IDF cosine
+    relevance to the topic profile, source weight and cross-source coverage (how
+    many other outlets ran the story, from near-duplicate merging). The term matrix
+    is kept in sparse coordinate form, so memory grows with tokens rather than
+    documents x vocabulary.
+    """
+    import numpy as np
+    
+    if not articles:
+        return []
+    
+    config = config or RANKING_CONFIG
+    current_span().set(candidates=len(articles), top_k=top_k)
+    weights = config['weights']
+    today = today or datetime.utcnow().date()
+    n = len(articles)
+    
+    # Sparse (document, term) coordinates; titles count double
+    tokens, lengths = [], []
+    for article in articles:
+        article_tokens = rank_tokens(article.get('title', '')) * 2 + rank_tokens(article.get('summary', ''))
+        tokens.extend(article_tokens)
+        lengths.append(len(article_tokens))
+    vocabulary = {token: index for index, token in enumerate(dict.fromkeys(tokens))}
+    
+    relevance = np.zeros(n)
+    profile_tokens = rank_tokens(config['topic_profile'])
+    if tokens and profile_tokens:
+        doc_index = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        term_index = np.fromiter(map(vocabulary.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+        vocab_size = len(vocabulary)
+        
+        # Term frequencies per (document, term) pair
+        pairs, tf = np.unique(doc_index * vocab_size + term_index, return_counts=True)
+        pair_docs, pair_terms = pairs // vocab_size, pairs % vocab_size
+        
+        document_frequency = np.bincount(pair_terms, minlength=vocab_size)
+        idf = np.log((1 + n) / (1 + document_frequency)) + 1
+        tfidf = (1 + np.log(tf)) * idf[pair_terms]
+        doc_norms = np.sqrt(np.bincount(pair_docs, weights=tfidf ** 2, minlength=n))
+        
+        profile = np.zeros(vocab_size)
+        for token in profile_tokens:
+            if token in vocabulary:
+                profile[vocabulary[token]] += 1
+        profile = profile * idf
+        profile_norm = np.linalg.norm(profile)
+        
+        if profile_norm > 0:
+            dots = np.bincount(pair_docs, weights=tfidf * profile[pair_terms], minlength=n)
+            relevance = np.divide(dots, doc_norms * profile_norm, out=np.zeros(n), where=doc_norms > 0)
+    
+    ages = np.array([
+        (today - article['date']).days if hasattr(article.get('date'), 'year') else 7
+        for article in articles
+    ], dtype=float)
+    recency = 0.5 ** (np.clip(ages, 0, None) / max(config['recency_half_life_days'], 0.01))
+    
+    source_weight = np.array([SOURCE_WEIGHTS.get(article.get('source'), 1.0) for article in articles])
+    source_weight = source_weight / max(source_weight.max(), 1e-9)
+    
+    coverage_counts = np.array([len(article.get('also_covered_by', ())) for article in articles], dtype=float)
+    coverage = np.log1p(coverage_counts) / np.log1p(max(coverage_counts.max(), 1))
+    
+    scores = (weights['recency'] * recency + weights['relevance'] * relevance
+              + weights['source'] * source_weight + weights['coverage'] * coverage)
+    
+    # Stable sort keeps arrival order between equal scores
+    order = np.argsort(-scores, kind='stable')
+    if top_k is not None:
+        order = order[:top_k]
+    
+    ranked = []
+    for i in order:
+        article = articles[i]
+        article['relevance_score'] = round(float(scores[i]), 4)
+        ranked.append(article)
+    return ranked
+
+# --- Digest Profiles ---
+# Each entry in the "digests" block of feeds.json is one email drawn from the same
+# crawl and summary pass ("enabled": false pauses one); without the block a single
+# digest goes to RECIPIENT_EMAILS
+DEFAULT_DIGEST_PROFILE = {
+    'id': 'daily',
+    'enabled': True,
+    'title': "AI Technology News",
+    'recipients_env': "RECIPIENT_EMAILS",
+    'max_articles': 12,
+    'sources': None,
+    'summary_sentences': None,
+    'ranking': {}
+}
+
+def load_digest_profiles(path=FEEDS_CONFIG_PATH):
+    """Enabled digest profiles from the feed config, each filled in from the default profile"""
+    with open(path, encoding='utf-8') as config_file:
+        digests = json.load(config_file).get('digests') or [DEFAULT_DIGEST_PROFILE]
+    
+    profiles = []
+    for digest in digests:
+        profile = {**DEFAULT_DIGEST_PROFILE, **digest}
+        if not profile['id']:
+            raise ValueError(f"Digest profile without an id in {path}")
+        profiles.append(profile)
+    if len({profile['id'] for profile in profiles}) != len(profiles):
+        raise ValueError(f"Duplicate digest profile ids in {path}")
+    return [profile for profile in profiles if profile['enabled']] or [DEFAULT_DIGEST_PROFILE]
+
+DIGEST_PROFILES = load_digest_profiles()
+
+def profile_ranking_config(profile):
+    """The shared ranking config with the profile's topic and weight overrides applied"""
+    overrides = profile.get('ranking') or {}
+    return {
+        'topic_profile': overrides.get('topic_profile', RANKING_CONFIG['topic_profile']),
+        'weights': {**RANKING_CONFIG['weights'], **overrides.get('weights', {})},
+        'recency_half_life_days': overrides.get('recency_half_life_days', RANKING_CONFIG['recency_half_life_days'])
+    }
+
+def select_digest_articles(candidates, profile, today=None, limit=None):
+    """Pick one profile's articles from the shared candidate pool (no copies, no I/O)
+    
+    Recency is scored relative to `today` (a replayed day, or the current date),
+    and `limit` overrides the profile's article count.
+    """
+    limit = limit or profile['max_articles']
+    if profile.get('sources'):
+        allowed = set(profile['sources'])
+        candidates = [article for article in candidates if article.get('source') in allowed]
+    if RANKING_ENABLED:
+        return rank_articles(candidates, top_k=limit, config=profile_ranking_config(profile), today=today)
+    return candidates[:limit]
+
+def digest_recipients(profile):
+    """Recipient addresses for a profile, read from its environment variable"""
+    recipient_emails_str = os.getenv(profile['recipients_env'], "")
+    return [email.strip() for email in recipient_emails_str.split(',') if email.strip()]
+
+def delivered_digests(digest_date=None):
+    """Profile ids already sent for the date, so a retried run only re-sends the failures"""
+    digest_date = (digest_date or datetime.utcnow().date()).isoformat()
+    conn = open_state_db()
+    try:
+        rows = conn.execute("SELECT profile_id FROM digest_deliveries WHERE digest_date = ?",
+                            (digest_date,)).fetchall()
+    finally:
+        conn.close()
+    return {row[0] for row in rows}
+
+def record_digest_delivery(profile_id, article_count, digest_date=None):
+    import time
+    
+    digest_date = (digest_date or datetime.utcnow().date()).isoformat()
+    conn = open_state_db()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO digest_deliveries (digest_date, profile_id, articles, sent_at) "
+                "VALUES (?, ?, ?, ?)",
+                (digest_date, profile_id, article_count, time.time())
+            )
+    finally:
+        conn.close()
+
+def stream_news_articles(fetch_stats=None, deadline=None):
+    """Yield unique articles as soon as each feed returns (producer/consumer pipeline)
+    
+    The asyncio fetch engine runs on a background thread and hands articles over
+    through a bounded queue, so slow consumers apply backpressure. Deduplication is
+    incremental against one seen-set. Fetch timing is written to `fetch_stats` when
+    the stream finishes. Fetching stops at FEED_FETCH_TIMEOUT or `deadline`,
+    whichever comes first.
+    """
+    import asyncio
+    import queue
+    import time
+    
+    start_time = time.time()
+    deadline = min(start_time + FEED_FETCH_TIMEOUT, deadline or float('inf'))
+    article_queue = queue.Queue(maxsize=ARTICLE_QUEUE_SIZE)
+    stopped = threading.Event()
+    fetch_done = object()
+    
+    def offer(item):
+        """Put into the queue, giving up once the consumer has stopped"""
+        while not stopped.is_set():
+            try:
+                article_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+    
+    def deliver(articles):
+        # Only the daily delta moves on: stories from earlier digests are dropped here
+        for article in filter_unsent_articles(articles):
+            offer(article)
+    
+    def produce():
+        try:
+            with span('feeds.fetch_all'):
+                asyncio.run(fetch_feeds_async(RSS_FEEDS, deliver, deadline, stopped))
+        except Exception as e:
+            print(f"Feed fetch engine error: {e}")
+        finally:
+            offer(fetch_done)
+    
+    threading.Thread(target=with_trace_context(produce), name="feed-fetcher", daemon=True).start()
+    
+    seen_titles = set()
+    near_duplicates = NearDuplicateIndex() if NEAR_DUPLICATE_THRESHOLD > 0 else None
+    yielded = 0
+    received = 0
+    dedup_time = 0.0
+    
+    try:
+        while True:
+            try:
+                # Small grace period past the deadline for the engine to report back
+                item = article_queue.get(timeout=max(0, deadline - time.time()) + 1)
+            except queue.Empty:
+                print("Parallel fetch timeout: feed engine did not finish in time")
+                break
+            
+            if item is fetch_done:
+                break
+            
+            received += 1
+            dedup_start = time.time()
+            unique = remove_duplicates([item], seen_titles, near_duplicates)
+            dedup_time += time.time() - dedup_start
+            for article in unique:
+                yielded += 1
+                yield article
+    finally:
+        # The engine sees `stopped` and cancels any feeds still in flight
+        stopped.set()
+        
+        fetch_time = time.time() - start_time
+        # Deduplication runs one article at a time, so it is reported as one summed span
+        add_span('feed.dedup', start_time, start_time + dedup_time, articles_in=received, unique=yielded,
+                 duplicates=received - yielded, summed=True)
+        print(f"RSS fetch completed in {fetch_time:.2f}s with {yielded} articles")
+        if fetch_stats is not None:
+            fetch_stats['fetch_time'] = fetch_time
+            fetch_stats['articles'] = yielded
+
+def fetch_news_articles():
+    """Optimized RSS fetching with parallel processing for sub-30 second execution"""
+    from itertools import islice
+    
+    # Limit to 18 articles for processing (6 feeds × 3 articles avg)
+    article_stream = stream_news_articles()
+    try:
+        if RANKING_ENABLED:
+            return rank_articles(list(article_stream), top_k=18)
+        return list(islice(article_stream, 18))
+    finally:
+        article_stream.close()
 
 def extract_domain(url):
-    """Extract clean, readable domain name from URL for source attribution"""
+    """Extract clean, readable source name for a feed URL, falling back to its domain"""
+    if url in FEED_NAMES:
+        return FEED_NAMES[url]
+    
     try:
         from urllib.parse import urlparse
         domain = urlparse(url).netloc
@@ -108,109 +1482,1072 @@ def extract_domain(url):
         # Clean up domain name
         domain = domain.replace('www.', '').replace('feeds.', '').replace('feed.', '')
         
-        # Create more readable source names (updated for 6 feeds)
-        source_mapping = {
-            'technologyreview.com': 'MIT Technology Review',
-            'venturebeat.com': 'VentureBeat',
-            'marktechpost.com': 'MarkTechPost',
-            'research.google': 'Google Research',
-            'techcrunch.com': 'TechCrunch',
-            'artificialintelligence-news.com': 'AI News',
-            # Legacy mappings (in case feeds change)
-            'feedburner.com': 'AI News',
-            'wired.com': 'Wired',
-            'ai-techpark.com': 'AI TechPark',
-            'bair.berkeley.edu': 'Berkeley AI Research',
-            '404media.co': '404 Media'
-        }
-        
-        # Return mapped name if available, otherwise cleaned domain
-        return source_mapping.get(domain, domain.capitalize())
+        # Return configured name if available, otherwise cleaned domain
+        return SOURCE_NAMES.get(domain, domain.capitalize())
         
     except:
         return "Unknown"
 
-def remove_duplicates(articles):
-    """Remove duplicate articles based on title similarity"""
+def remove_duplicates(articles, seen_titles=None, near_duplicates=None):
+    """Remove duplicate articles based on title similarity
+    
+    Exact matches are caught on the normalized title; near-duplicates (the same story
+    under different headlines) are merged into the first article seen, which lists
+    the other outlets in 'also_covered_by'. Pass a shared `seen_titles` set and
+    NearDuplicateIndex to deduplicate incrementally across calls.
+    """
     unique_articles = []
-    seen_titles = set()
+    if seen_titles is None:
+        seen_titles = set()
+    if near_duplicates is None and NEAR_DUPLICATE_THRESHOLD > 0:
+        near_duplicates = NearDuplicateIndex()
     
     for article in articles:
         # Create a normalized version of the title for comparison
         normalized_title = re.sub(r'[^a-zA-Z0-9\s]', '', article['title'].lower()).strip()
-        if normalized_title not in seen_titles:
-            seen_titles.add(normalized_title)
-            unique_articles.append(article)
+        if normalized_title in seen_titles:
+            continue
+        seen_titles.add(normalized_title)
+        
+        if near_duplicates is not None:
+            canonical = near_duplicates.add(article)
+            if canonical is not None:
+                merge_near_duplicate(canonical, article)
+                continue
+        
+        unique_articles.append(article)
     
     return unique_articles
 
-def summarize_with_gemini(articles):
-    """Optimized AI summarization for sub-120 second execution"""
+# --- Near-Duplicate Detection ---
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.35"))  # Jaccard; 0 disables
+NEAR_DUPLICATE_MIN_SHINGLES = int(os.getenv("NEAR_DUPLICATE_MIN_SHINGLES", "8"))  # Shorter entries never merge
+MINHASH_BANDS = 32
+MINHASH_ROWS = 2  # 64 hash functions; candidate pairs start around 0.18 similarity
+
+SHINGLE_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+new how why what its into about after over says said you your we our their they
+ai artificial intelligence
+""".split())
+
+class NearDuplicateIndex:
+    """Incremental MinHash/LSH index for clustering stories covered by several sources
+    
+    Each article is shingled (content words of title + summary), reduced
+    to a MinHash signature and bucketed per band, so lookups only compare against
+    the few articles sharing a band bucket and a full pass stays linear.
+    Only articles from different sources merge, and only when both have at least
+    `min_shingles` words: on a bare headline a shared name or two is already a
+    high overlap.
+    """
+    
+    _PRIME = (1 << 61) - 1
+    
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD, bands=MINHASH_BANDS, rows=MINHASH_ROWS,
+                 min_shingles=NEAR_DUPLICATE_MIN_SHINGLES):
+        import random
+        
+        self.threshold = threshold
+        self.min_shingles = max(1, min_shingles)
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(42)  # Fixed seed keeps clustering deterministic across runs
+        self.hash_params = [(rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME))
+                            for _ in range(bands * rows)]
+        self.buckets = {}
+        self.entries = []  # (article, shingle set)
+    
+    @staticmethod
+    def shingles(article):
+        """Word shingles of the title and summary, without markup or stopwords
+        
+        Single words rather than n-grams, since rewritten headlines keep the same
+        entities and terms but rarely the same word order.
+        """
+        text = f"{article.get('title', '')} {article.get('summary', '')}"
+        text = re.sub(r'<[^>]+>', ' ', text).lower()
+        return {word for word in re.findall(r'[a-z0-9]+', text) if word not in SHINGLE_STOPWORDS}
+    
+    def signature(self, shingles):
+        import zlib
+        
+        hashed = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles]
+        return [min((a * h + b) % self._PRIME for h in hashed) for a, b in self.hash_params]
+    
+    def add(self, article):
+        """Index the article, returning the canonical article it duplicates (or None)"""
+        shingles = self.shingles(article)
+        if len(shingles) < self.min_shingles:
+            return None
+        
+        signature = self.signature(shingles)
+        band_keys = [(band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                     for band in range(self.bands)]
+        
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self.buckets.get(key, ()))
+        
+        for position in sorted(candidates):
+            canonical, canonical_shingles = self.entries[position]
+            if canonical.get('source') == article.get('source'):
+                continue
+            similarity = len(shingles & canonical_shingles) / len(shingles | canonical_shingles)
+            if similarity >= self.threshold:
+                return canonical
+        
+        position = len(self.entries)
+        self.entries.append((article, shingles))
+        for key in band_keys:
+            self.buckets.setdefault(key, []).append(position)
+        return None
+
+def merge_near_duplicate(canonical, duplicate):
+    """Record the duplicate's source on the canonical article's "also covered by" list"""
+    covered_by = canonical.setdefault('also_covered_by', [])
+    source = duplicate.get('source')
+    if source and source != canonical.get('source') and source not in covered_by:
+        covered_by.append(source)
+
+# --- Article Extraction ---
+# Feed entries carry a teaser at best, so the summarizer optionally reads the
+# linked page itself. Pages are fetched only for summary-cache misses, with
+# global and per-host concurrency caps, a per-page time limit and a byte cap,
+# and the readable text is cached so a story is downloaded once. Links come from
+# the feeds, so every hop must resolve to a public address.
+ARTICLE_EXTRACTION = os.getenv("ARTICLE_EXTRACTION", "0") == "1"
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "8"))  # Pages in flight across all hosts
+EXTRACT_PER_HOST_LIMIT = int(os.getenv("EXTRACT_PER_HOST_LIMIT", "2"))  # Pages in flight per host
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "4"))  # Per page, connect to last byte, in seconds
+EXTRACT_MAX_BYTES = int(os.getenv("EXTRACT_MAX_BYTES", str(512 * 1024)))  # Rest of the page is not downloaded
+EXTRACT_EXCERPT_TOKENS = int(os.getenv("EXTRACT_EXCERPT_TOKENS", "500"))  # Article text sent per prompt
+EXTRACT_MAX_TEXT_CHARS = 20000  # Readable text kept in the cache per page
+EXTRACT_MIN_PARAGRAPH_CHARS = 40  # Shorter blocks are bylines, captions and share links
+EXTRACT_CACHE_TTL_DAYS = 14
+EXTRACT_MAX_REDIRECTS = 5
+EXTRACT_ALLOW_PRIVATE = os.getenv("EXTRACT_ALLOW_PRIVATE", "0") == "1"  # Local test servers (bench/) only
+
+def clean_html_text(text):
+    """Plain text from an HTML snippet: tags removed, entities decoded, whitespace collapsed"""
+    import html
+    
+    return re.sub(r'\s+', ' ', html.unescape(re.sub(r'<[^>]*(?:>|$)', ' ', text or ''))).strip()
+
+class ReadableTextParser(HTMLParser):
+    """Collects paragraph-level text blocks, skipping scripts, navigation and other page chrome"""
+    SKIP_TAGS = frozenset(('script', 'style', 'noscript', 'template', 'svg', 'iframe', 'nav', 'header',
+                           'footer', 'aside', 'form', 'button', 'figure'))
+    BLOCK_TAGS = frozenset(('p', 'h2', 'h3', 'li', 'blockquote', 'pre'))
+    CONTENT_TAGS = frozenset(('article', 'main'))
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.content_depth = 0
+        self.block = None
+        self.blocks = []  # (text, inside <article>/<main>)
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.CONTENT_TAGS:
+            self.content_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.flush()
+            self.block = []
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.CONTENT_TAGS:
+            self.flush()
+            self.content_depth = max(0, self.content_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.flush()
+    
+    def handle_data(self, data):
+        if self.block is not None and not self.skip_depth:
+            self.block.append(data)
+    
+    def flush(self):
+        if self.block:
+            text = re.sub(r'\s+', ' ', ''.join(self.block)).strip()
+            if len(text) >= EXTRACT_MIN_PARAGRAPH_CHARS:
+                self.blocks.append((text, self.content_depth > 0))
+        self.block = None
+
+def extract_readable_text(page):
+    """Main text of an HTML page, one paragraph per line ('' if nothing readable)"""
+    parser = ReadableTextParser()
+    try:
+        parser.feed(page)
+        parser.close()
+    except Exception:
+        pass  # Keep whatever parsed before the markup went wrong
+    parser.flush()
+    
+    # Prefer the <article>/<main> body when the page marks one up
+    blocks = [text for text, in_content in parser.blocks if in_content] or [text for text, _ in parser.blocks]
+    return "\n".join(blocks)[:EXTRACT_MAX_TEXT_CHARS]
+
+def text_excerpt(text, max_tokens=EXTRACT_EXCERPT_TOKENS):
+    """Leading part of `text` within a token budget, cut at a sentence end where possible"""
+    # Same ~4 characters per token estimate as the rate limiter uses
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = max(cut.rfind('. '), cut.rfind('.\n'))
+    if sentence_end >= max_chars // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(' ', 1)[0] + '...'
+
+def load_article_texts(urls):
+    """Return {url: text} for fresh cached pages; '' marks a page with nothing readable"""
     import time
     
-    start_time = time.time()
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not urls:
+        return {}
     
-    if not articles: 
-        return []
-    if not gemini_api_key: 
-        return articles[:12]  # Return articles without AI summaries
+    try:
+        conn = open_state_db()
+        try:
+            placeholders = ','.join('?' * len(urls))
+            rows = conn.execute(
+                f"SELECT url, text FROM article_text WHERE url IN ({placeholders}) AND fetched_at >= ?",
+                (*urls, time.time() - EXTRACT_CACHE_TTL_DAYS * 86400)
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Article text cache read failed: {e}")
+        return {}
+    return dict(rows)
+
+def save_article_texts(texts):
+    """Store {url: text} pairs and drop expired pages"""
+    import time
+    
+    if not texts:
+        return
+    
+    now = time.time()
+    try:
+        conn = open_state_db()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO article_text (url, text, fetched_at) VALUES (?, ?, ?)",
+                                 [(url, text, now) for url, text in texts.items()])
+                conn.execute("DELETE FROM article_text WHERE fetched_at < ?",
+                             (now - EXTRACT_CACHE_TTL_DAYS * 86400,))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Article text cache write failed: {e}")
+
+_extract_client = None
+_extract_client_lock = threading.Lock()
+_extract_slots = threading.BoundedSemaphore(max(1, EXTRACT_CONCURRENCY))
+_extract_host_slots = {}
+
+def article_http_client():
+    """One pooled httpx client for page downloads, reused across warm invocations"""
+    global _extract_client
+    import httpx
+    
+    with _extract_client_lock:
+        if _extract_client is None:
+            limits = httpx.Limits(max_connections=max(1, EXTRACT_CONCURRENCY),
+                                  max_keepalive_connections=max(1, EXTRACT_CONCURRENCY))
+            # Redirects are followed by fetch_article_text, which checks each hop's address
+            _extract_client = httpx.Client(limits=limits, follow_redirects=False,
+                                           headers={'User-Agent': FEED_USER_AGENT, 'Accept': 'text/html'})
+        return _extract_client
+
+def is_public_url(url):
+    """True when the URL is http(s) and its host resolves only to public addresses
+    
+    Keeps feed-supplied links (and their redirects) away from loopback, private,
+    link-local and other internal addresses.
+    """
+    import ipaddress
+    import socket
+    from urllib.parse import urlparse
     
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    if EXTRACT_ALLOW_PRIVATE:
+        return True
     try:
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')  # Use Gemini 2.5 Flash for better quality
+        addresses = socket.getaddrinfo(parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80),
+                                       proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError):
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(address[4][0].split('%')[0]).is_global
+                                   for address in addresses)
+
+def fetch_article_text(url, page_timeout):
+    """Download one page within the caps and return its readable text
+    
+    Returns '' for pages that will never yield text (4xx, not HTML, a link or
+    redirect to a non-public address) and None for failures worth retrying on a
+    later run (timeouts, 5xx, network errors).
+    """
+    import time
+    from urllib.parse import urlparse
+    import httpx
+    
+    host = urlparse(url).netloc
+    with _extract_client_lock:
+        host_slot = _extract_host_slots.setdefault(host, threading.BoundedSemaphore(max(1, EXTRACT_PER_HOST_LIMIT)))
+    
+    with span('extract.fetch', url=url) as page_span:
+        queued = time.time()
+        if not _extract_slots.acquire(timeout=page_timeout):
+            page_span.error = "no free download slot"
+            return None
+        try:
+            if not host_slot.acquire(timeout=max(0, queued + page_timeout - time.time())):
+                page_span.error = "no free slot for host"
+                return None
+            try:
+                started = time.time()
+                page_span.set(queue_wait_ms=round((started - queued) * 1000, 1))
+                page_deadline = started + page_timeout
+                for hop in range(EXTRACT_MAX_REDIRECTS + 1):
+                    if not is_public_url(url):
+                        page_span.error = f"not a public address: {url}"[:300]
+                        return ''
+                    timeout = httpx.Timeout(max(0.1, page_deadline - time.time()))
+                    with article_http_client().stream('GET', url, timeout=timeout) as response:
+                        page_span.set(status=response.status_code, redirects=hop)
+                        if response.is_redirect and response.next_request is not None:
+                            url = str(response.next_request.url)
+                            continue
+                        if response.status_code >= 500:
+                            return None
+                        if response.status_code >= 300 or 'html' not in response.headers.get('content-type', 'text/html'):
+                            return ''
+                        
+                        chunks = []
+                        size = 0
+                        for chunk in response.iter_bytes():
+                            chunks.append(chunk)
+                            size += len(chunk)
+                            if size >= EXTRACT_MAX_BYTES:
+                                page_span.set(truncated=True)
+                                break
+                            if time.time() > page_deadline:
+                                raise TimeoutError(f"page took over {page_timeout:.1f}s")
+                        page = b''.join(chunks)[:EXTRACT_MAX_BYTES].decode(response.encoding or 'utf-8',
+                                                                            errors='replace')
+                    break
+                else:
+                    page_span.error = f"over {EXTRACT_MAX_REDIRECTS} redirects"
+                    return ''
+                page_span.set(bytes=size, latency_ms=round((time.time() - started) * 1000, 1))
+            finally:
+                host_slot.release()
+        except Exception as e:
+            page_span.error = f"{type(e).__name__}: {e}"[:300]
+            return None
+        finally:
+            _extract_slots.release()
+        
+        text = extract_readable_text(page)
+        page_span.set(chars=len(text))
+        return text
+
+@traced('extract')
+def extract_article_texts(articles, deadline=None):
+    """Token-budgeted excerpts of the linked pages, aligned with `articles`
+    
+    An excerpt is '' where the page has no usable text and None where it couldn't
+    be downloaded this time (worth retrying on a later run).
+    Cached text is used first; the rest is downloaded in parallel. Each page gets at
+    most EXTRACT_TIMEOUT, and near `deadline` at most half the time left, so the
+    summarizer always keeps time for the AI call itself.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    
+    # Cached under the canonical link, downloaded from the link as published
+    links = [canonical_link(article.get('link', '')) for article in articles]
+    page_urls = {link: article['link'] for link, article in zip(links, articles) if link}
+    texts = load_article_texts(sorted(page_urls))
+    pending = [link for link in page_urls if link not in texts]
+    extract_span = current_span()
+    extract_span.set(articles=len(articles), cached=len(page_urls) - len(pending), fetched=0)
+    
+    page_timeout = EXTRACT_TIMEOUT
+    if deadline is not None:
+        page_timeout = min(page_timeout, (deadline - time.time()) / 2)
+    if pending and page_timeout >= 0.5:
+        with ThreadPoolExecutor(max_workers=min(len(pending), max(1, EXTRACT_CONCURRENCY))) as executor:
+            futures = {link: executor.submit(with_trace_context(fetch_article_text), page_urls[link], page_timeout)
+                       for link in pending}
+            fetched = {link: future.result() for link, future in futures.items()}
+        # Transient failures (None) are not cached, so a later run tries again
+        fetched = {link: text for link, text in fetched.items() if text is not None}
+        save_article_texts(fetched)
+        texts.update(fetched)
+        extract_span.set(fetched=len(fetched))
+    
+    excerpts = [None if link and link not in texts else text_excerpt(texts[link]) if link and texts[link] else ''
+                for link in links]
+    extract_span.set(excerpts=sum(1 for excerpt in excerpts if excerpt))
+    return excerpts
+
+# --- Gemini Rate Limiting ---
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+GEMINI_WORKERS = int(os.getenv("GEMINI_WORKERS", "4"))
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "10"))  # Free tier limit for Gemini 2.5 Flash
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "250000"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "0"))  # >1 packs that many articles per call
+GEMINI_API_URL = os.getenv("GEMINI_API_URL", "")  # Alternative REST endpoint, e.g. bench/mock_gemini.py
+
+class TokenBucketRateLimiter:
+    """Thread-safe limiter enforcing requests-per-minute and tokens-per-minute budgets"""
+    
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        import threading
+        import time
         
-        # Process 10-12 articles for better coverage with 6 RSS feeds
-        articles_to_process = articles[:12]
-        summarized_articles = []
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self.request_allowance = self.request_capacity
+        self.token_allowance = self.token_capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, tokens=1, deadline=None):
+        """Block until one request and `tokens` tokens are available
         
-        print(f"Processing {len(articles_to_process)} articles with Gemini 2.5 Flash...")
+        Returns False without consuming anything if that would take past `deadline`.
+        """
+        import time
         
-        for i, article in enumerate(articles_to_process):
-            try:
-                # Balanced prompt for detailed but focused summaries
-                prompt = f"""Summarize this AI/tech article in 3-4 informative sentences. Include key details about what happened, who is involved, the technology or methods mentioned, and the significance or implications. Focus on factual content from the article without adding generic industry commentary.
+        tokens = min(tokens, self.token_capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed = now - self.last_refill
+                self.last_refill = now
+                self.request_allowance = min(self.request_capacity, self.request_allowance + elapsed * self.request_rate)
+                self.token_allowance = min(self.token_capacity, self.token_allowance + elapsed * self.token_rate)
+                
+                if self.request_allowance >= 1 and self.token_allowance >= tokens:
+                    self.request_allowance -= 1
+                    self.token_allowance -= tokens
+                    return True
+                
+                wait = max(
+                    (1 - self.request_allowance) / self.request_rate if self.request_allowance < 1 else 0,
+                    (tokens - self.token_allowance) / self.token_rate if self.token_allowance < tokens else 0
+                )
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+# Shared across warm invocations so back-to-back runs can't exceed the quota together
+gemini_rate_limiter = TokenBucketRateLimiter(GEMINI_RPM, GEMINI_TPM)
+
+# google.generativeai takes most of a second to import, so it is only loaded
+# once a run actually summarizes, and the configured model is kept for later
+# warm invocations instead of being rebuilt per request
+_gemini_models = {}
+_gemini_models_lock = threading.Lock()
+
+def gemini_model(api_key):
+    """The configured GenerativeModel for `api_key`, built once per process"""
+    with _gemini_models_lock:
+        model = _gemini_models.get(api_key)
+        if model is None:
+            import google.generativeai as genai
+            
+            if GEMINI_API_URL:
+                genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': GEMINI_API_URL})
+            else:
+                genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(GEMINI_MODEL_NAME)  # Use Gemini 2.5 Flash for better quality
+            _gemini_models[api_key] = model
+        return model
+
+def is_retryable_gemini_error(error):
+    """True for rate limiting (429) and transient server-side (5xx) failures"""
+    from google.api_core import exceptions as google_exceptions
+    
+    if isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted,
+                          google_exceptions.ServerError, google_exceptions.DeadlineExceeded)):
+        return True
+    code = getattr(error, 'code', None)
+    return code == 429 or (isinstance(code, int) and 500 <= code < 600)
+
+def article_prompt_content(article, excerpt=None):
+    """Extracted page text when there is some, else the feed's own teaser"""
+    return excerpt or clean_html_text(article.get('summary', ''))[:300]
+
+def build_summary_prompt(article, excerpt=None):
+    """Balanced prompt for detailed but focused summaries"""
+    return f"""Summarize this AI/tech article in 3-4 informative sentences. Include key details about what happened, who is involved, the technology or methods mentioned, and the significance or implications. Focus on factual content from the article without adding generic industry commentary.
 
 Title: {article['title']}
-Article Content: {article.get('summary', '')[:300]}
+Article Content: {article_prompt_content(article, excerpt)}
 
 Provide a detailed, factual summary:"""
-                
-                response = model.generate_content(prompt)
-                
-                if response and response.text and response.text.strip():
-                    ai_summary = response.text.strip()
-                    if len(ai_summary) > 50:
-                        enhanced_article = article.copy()
-                        enhanced_article['ai_summary'] = ai_summary
-                        summarized_articles.append(enhanced_article)
-                        print(f"✅ {i+1}/12: {article['title'][:40]}...")
-                        continue
-                
-                # Quick fallback
-                enhanced_article = article.copy()
-                enhanced_article['ai_summary'] = create_quick_fallback_summary(article)
-                summarized_articles.append(enhanced_article)
-                
+
+def build_batch_summary_prompt(indexed_articles, excerpts=None):
+    """Pack several articles into one prompt that asks for a JSON array of summaries"""
+    excerpts = excerpts or {}
+    article_blocks = "\n\n".join(
+        f"[{i}] Title: {article['title']}\nArticle Content: {article_prompt_content(article, excerpts.get(i))}"
+        for i, article in indexed_articles
+    )
+    return f"""Summarize each of the following AI/tech articles in 3-4 informative sentences. Include key details about what happened, who is involved, the technology or methods mentioned, and the significance or implications. Focus on factual content from each article without adding generic industry commentary.
+
+{article_blocks}
+
+Respond with only a JSON array, one object per article, in the form [{{"index": <number in brackets>, "summary": "<summary>"}}]:"""
+
+def parse_batch_summaries(text):
+    """Return {index: summary} from a batch reply, or {} if it doesn't parse"""
+    # Models sometimes wrap JSON in a markdown code fence
+    text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text.strip())
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return {}
+    
+    summaries = {}
+    if isinstance(items, list):
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get('index'))
+            except (TypeError, ValueError):
+                continue
+            summary = item.get('summary')
+            if isinstance(summary, str) and summary.strip():
+                summaries[index] = summary.strip()
+    return summaries
+
+class SummarizerRefused(TimeoutError):
+    """A call turned down by the run deadline or the local rate limit, or cut off by the deadline
+    
+    Says nothing about the backend's health, so it isn't recorded as a failure.
+    """
+
+@traced('gemini.generate')
+def generate_summary(model, prompt, reply_tokens=300, generation_config=None, deadline=None, usage=None):
+    """Single rate-limited Gemini call with per-call timeout and exponential backoff
+    
+    With a `deadline`, the call timeout shrinks to the time left and no wait, retry
+    or backoff starts that would overrun it. SummarizerRefused is raised when the
+    first attempt can't start in time, or times out only because the deadline
+    shortened its timeout; after a failed attempt, that error is raised.
+    Token counts of the answered call are added to `usage`, if given.
+    """
+    import random
+    import time
+    
+    # Rough estimate: ~4 characters per token plus room for the reply
+    estimated_tokens = len(prompt) // 4 + reply_tokens
+    call_span = current_span()
+    call_span.set(model=GEMINI_MODEL_NAME, prompt_chars=len(prompt), estimated_tokens=estimated_tokens,
+                  retries=0, rate_limit_wait_ms=0.0)
+    
+    last_error = None
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        wait_start = time.time()
+        acquired = gemini_rate_limiter.acquire(estimated_tokens, deadline)
+        call_span.attributes['rate_limit_wait_ms'] += round((time.time() - wait_start) * 1000, 1)
+        if not acquired:
+            raise last_error or SummarizerRefused("rate limit wait would pass the summarization deadline")
+        
+        timeout = GEMINI_TIMEOUT
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.time())
+            if timeout <= 0:
+                raise last_error or SummarizerRefused("summarization deadline passed")
+        
+        call_start = time.time()
+        try:
+            response = model.generate_content(prompt, generation_config=generation_config,
+                                              request_options={'timeout': timeout})
+            text = response.text.strip() if response and response.text else ''
+            metadata = getattr(response, 'usage_metadata', None)
+            prompt_tokens = getattr(metadata, 'prompt_token_count', None) or len(prompt) // 4
+            answer_tokens = getattr(metadata, 'candidates_token_count', None) or len(text) // 4
+            call_span.set(prompt_tokens=prompt_tokens, reply_tokens=answer_tokens)
+            if usage is not None:
+                usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + prompt_tokens
+                usage['reply_tokens'] = usage.get('reply_tokens', 0) + answer_tokens
+            return text
+        except Exception as e:
+            # Ran out the timeout the deadline cut short: the run was out of time, Gemini may be fine
+            if timeout < GEMINI_TIMEOUT and time.time() - call_start >= timeout - 0.05:
+                raise last_error or SummarizerRefused(f"summarization deadline reached mid-call: {e}") from e
+            if attempt >= GEMINI_MAX_RETRIES or not is_retryable_gemini_error(e):
+                raise
+            delay = min(2 ** attempt, 16) + random.uniform(0, 0.5)
+            if deadline is not None and time.time() + delay >= deadline:
+                raise
+            last_error = e
+            call_span.set(retries=attempt + 1, last_retry_error=str(e)[:200])
+            print(f"Gemini retry {attempt + 1}/{GEMINI_MAX_RETRIES} in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+# --- Summarizer Backends ---
+# Summaries come from an ordered chain of backends (SUMMARIZER_BACKENDS). An
+# article goes to the first backend and falls through to the next one when the
+# call fails. Each backend's latency, failures, tokens and cost are recorded in
+# summarizer_health. A backend that keeps failing moves to the back of the chain
+# for a while. With SUMMARIZER_STRATEGY=fastest, healthy backends are tried in
+# order of recent latency instead of configured order.
+SUMMARIZER_BACKENDS = [name.strip() for name in os.getenv("SUMMARIZER_BACKENDS", "gemini,local").split(',')
+                       if name.strip()]
+SUMMARIZER_STRATEGY = os.getenv("SUMMARIZER_STRATEGY", "ordered")  # "ordered" or "fastest"
+SUMMARIZER_HEALTH_SAMPLES = 50  # Recent calls kept per backend for latency/error statistics
+SUMMARIZER_UNHEALTHY_AFTER = 3  # Consecutive failed calls before a backend is moved to the back
+SUMMARIZER_RETRY_AFTER = 900  # Seconds before an unhealthy backend gets its place back
+GEMINI_PRICE_INPUT = float(os.getenv("GEMINI_PRICE_INPUT", "0.30"))  # USD per million prompt tokens
+GEMINI_PRICE_OUTPUT = float(os.getenv("GEMINI_PRICE_OUTPUT", "2.50"))  # USD per million reply tokens
+
+class SummarizerBackend:
+    """One way of turning articles into summaries
+    
+    `summarize` returns one summary and `summarize_batch` {index: summary}; both
+    raise on failure and add the tokens they used to `usage`. A summary of 50
+    characters or less counts as no summary.
+    """
+    name = None
+    model_name = None  # Part of the summary cache key
+    workers = 1
+    batch_size = 1
+    price_input = price_output = 0.0  # USD per million tokens
+    
+    def available(self):
+        return True
+    
+    def summarize(self, article, excerpt=None, deadline=None, usage=None):
+        raise NotImplementedError
+    
+    def summarize_batch(self, indexed_articles, excerpts=None, deadline=None, usage=None):
+        excerpts = excerpts or {}
+        return {i: self.summarize(article, excerpts.get(i), deadline, usage) for i, article in indexed_articles}
+    
+    def cost(self, usage):
+        return (usage.get('prompt_tokens', 0) * self.price_input + usage.get('reply_tokens', 0) * self.price_output) / 1e6
+
+class GeminiBackend(SummarizerBackend):
+    """Gemini 2.5 Flash behind the shared rate limiter, batched when GEMINI_BATCH_SIZE > 1"""
+    name = 'gemini'
+    model_name = GEMINI_MODEL_NAME
+    workers = GEMINI_WORKERS
+    batch_size = GEMINI_BATCH_SIZE
+    price_input = GEMINI_PRICE_INPUT
+    price_output = GEMINI_PRICE_OUTPUT
+    
+    def __init__(self):
+        self.model = None
+    
+    def available(self):
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            return False
+        try:
+            self.model = gemini_model(api_key)
+        except Exception as e:
+            print(f"Gemini AI error: {e}")
+            return False
+        return True
+    
+    def summarize(self, article, excerpt=None, deadline=None, usage=None):
+        return generate_summary(self.model, build_summary_prompt(article, excerpt), deadline=deadline, usage=usage)
+    
+    def summarize_batch(self, indexed_articles, excerpts=None, deadline=None, usage=None):
+        reply = generate_summary(
+            self.model,
+            build_batch_summary_prompt(indexed_articles, excerpts),
+            reply_tokens=300 * len(indexed_articles),
+            generation_config={'response_mime_type': 'application/json'},
+            deadline=deadline,
+            usage=usage
+        )
+        return parse_batch_summaries(reply)
+
+class ExtractiveBackend(SummarizerBackend):
+    """Offline TextRank: the article's most central sentences, in their original order
+    
+    Runs on the CPU in a few milliseconds with no key or quota. It is the last
+    link of the default chain, and on its own it allows load tests without
+    Gemini traffic.
+    """
+    name = 'local'
+    model_name = 'textrank-v1'
+    workers = 4
+    SUMMARY_SENTENCES = 3
+    MAX_SENTENCES = 40
+    
+    def summarize(self, article, excerpt=None, deadline=None, usage=None):
+        text = article_prompt_content(article, excerpt).replace('\n', ' ')
+        sentences = [sentence for sentence in re.split(r'(?<=[.!?])\s+', text)
+                     if len(sentence.split()) >= 4][:self.MAX_SENTENCES]
+        if len(sentences) > self.SUMMARY_SENTENCES:
+            scores = textrank_scores(sentences)
+            top = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))[:self.SUMMARY_SENTENCES]
+            sentences = [sentences[i] for i in sorted(top)]
+        return ' '.join(sentences)
+
+SUMMARIZER_BACKEND_TYPES = {'gemini': GeminiBackend, 'local': ExtractiveBackend}
+
+def textrank_scores(sentences, damping=0.85, iterations=30):
+    """TextRank centrality of each sentence on a word-overlap similarity graph"""
+    import numpy as np
+    
+    words = [set(rank_tokens(sentence)) for sentence in sentences]
+    sizes = np.log(np.array([len(sentence_words) for sentence_words in words], dtype=float) + 1)
+    weights = np.zeros((len(sentences), len(sentences)))
+    for i in range(len(sentences)):
+        for j in range(i + 1, len(sentences)):
+            overlap = len(words[i] & words[j])
+            if overlap:
+                weights[i, j] = weights[j, i] = overlap / (sizes[i] + sizes[j])
+    
+    # Column-normalized transition matrix; isolated sentences keep the base score
+    totals = weights.sum(axis=0)
+    transitions = np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+    scores = np.ones(len(sentences))
+    for _ in range(iterations):
+        scores = (1 - damping) + damping * transitions @ scores
+    return scores.tolist()
+
+def load_summarizer_health():
+    """Return {backend: health record} for every backend that has one"""
+    try:
+        conn = open_state_db()
+        try:
+            rows = conn.execute(
+                "SELECT backend, latencies, outcomes, consecutive_failures, last_failure, calls, "
+                "prompt_tokens, reply_tokens, cost_usd FROM summarizer_health"
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Summarizer health read failed: {e}")
+        return {}
+    
+    return {backend: {
+        'latencies': json.loads(latencies),
+        'outcomes': json.loads(outcomes),
+        'consecutive_failures': consecutive_failures,
+        'last_failure': last_failure,
+        'calls': calls,
+        'prompt_tokens': prompt_tokens,
+        'reply_tokens': reply_tokens,
+        'cost_usd': cost_usd
+    } for backend, latencies, outcomes, consecutive_failures, last_failure, calls, prompt_tokens, reply_tokens,
+        cost_usd in rows}
+
+def record_summarizer_health(health, calls):
+    """Fold this run's calls [(backend, succeeded, latency, usage, cost)] into the stored records"""
+    import time
+    
+    if not calls:
+        return
+    now = time.time()
+    for backend, succeeded, latency, usage, cost in calls:
+        record = health.setdefault(backend, {'latencies': [], 'outcomes': [], 'consecutive_failures': 0,
+                                             'last_failure': None, 'calls': 0, 'prompt_tokens': 0,
+                                             'reply_tokens': 0, 'cost_usd': 0.0})
+        record['latencies'] = (record['latencies'] + [round(latency, 3)])[-SUMMARIZER_HEALTH_SAMPLES:]
+        record['outcomes'] = (record['outcomes'] + [1 if succeeded else 0])[-SUMMARIZER_HEALTH_SAMPLES:]
+        if succeeded:
+            record['consecutive_failures'] = 0
+        else:
+            record['consecutive_failures'] += 1
+            record['last_failure'] = now
+        record['calls'] += 1
+        record['prompt_tokens'] += usage.get('prompt_tokens', 0)
+        record['reply_tokens'] += usage.get('reply_tokens', 0)
+        record['cost_usd'] += cost
+    
+    try:
+        conn = open_state_db()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO summarizer_health (backend, latencies, outcomes, consecutive_failures, "
+                    "last_failure, calls, prompt_tokens, reply_tokens, cost_usd) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(backend, json.dumps(record['latencies']), json.dumps(record['outcomes']),
+                      record['consecutive_failures'], record['last_failure'], record['calls'],
+                      record['prompt_tokens'], record['reply_tokens'], record['cost_usd'])
+                     for backend, record in health.items() if backend in {call[0] for call in calls}]
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Summarizer health write failed: {e}")
+
+def summarizer_healthy(record, now):
+    """False while a backend that failed SUMMARIZER_UNHEALTHY_AFTER calls in a row is cooling down"""
+    return not (record and record['consecutive_failures'] >= SUMMARIZER_UNHEALTHY_AFTER
+                and now - (record['last_failure'] or 0) < SUMMARIZER_RETRY_AFTER)
+
+def summarizer_chain(health=None):
+    """Available backends in the order this run tries them
+    
+    Healthy backends come first, in configured order or, with the "fastest"
+    strategy, by median latency (untried backends first, so they get measured).
+    Unhealthy ones stay at the back as a last resort.
+    """
+    import time
+    
+    now = time.time()
+    health = load_summarizer_health() if health is None else health
+    backends = []
+    for name in SUMMARIZER_BACKENDS:
+        backend_type = SUMMARIZER_BACKEND_TYPES.get(name)
+        if backend_type is None:
+            print(f"Unknown summarizer backend '{name}' in SUMMARIZER_BACKENDS, skipping")
+            continue
+        backend = backend_type()
+        if backend.available():
+            backends.append(backend)
+    
+    healthy = [backend for backend in backends if summarizer_healthy(health.get(backend.name), now)]
+    if SUMMARIZER_STRATEGY == 'fastest':
+        healthy.sort(key=lambda backend: percentile(health[backend.name]['latencies'], 0.5)
+                     if health.get(backend.name, {}).get('latencies') else 0)
+    return healthy + [backend for backend in backends if backend not in healthy]
+
+def summarizer_health_report():
+    """Per-backend latency, error rate, tokens and cost for the /test endpoint"""
+    import time
+    
+    now = time.time()
+    health = load_summarizer_health()
+    report = []
+    for name in SUMMARIZER_BACKENDS:
+        record = health.get(name)
+        latencies = record['latencies'] if record else []
+        outcomes = record['outcomes'] if record else []
+        report.append({
+            'backend': name,
+            'p50_latency_s': percentile(latencies, 0.5) if latencies else None,
+            'p95_latency_s': percentile(latencies, 0.95) if latencies else None,
+            'error_rate': round(1 - sum(outcomes) / len(outcomes), 3) if outcomes else None,
+            'healthy': summarizer_healthy(record, now),
+            'calls': record['calls'] if record else 0,
+            'tokens': record['prompt_tokens'] + record['reply_tokens'] if record else 0,
+            'cost_usd': round(record['cost_usd'], 6) if record else 0.0
+        })
+    return report
+
+@traced('summarize')
+def summarize_with_gemini(articles, limit=12, deadline=None, summary_stats=None):
+    """Concurrent, rate-limited AI summarization that preserves article order
+    
+    `articles` may be a list or a stream (see stream_news_articles); each article is
+    dispatched to the worker pool as soon as it arrives, so summarization overlaps
+    with feed fetching. Each one goes through the summarizer chain (Gemini, then the
+    local extractive backend by default) until a backend answers. Articles still
+    pending at `deadline` get the quick fallback. Summary cache hits and misses,
+    and per-backend calls, latency, tokens and cost, are written to `summary_stats`
+    (see summarizer_run_report); each call counts only its own work, so runs
+    sharing the process don't mix their numbers.
+    """
+    import time
+    from itertools import islice
+    from concurrent.futures import ThreadPoolExecutor, wait
+    
+    start_time = time.time()
+    cache_stats = {'hits': 0, 'misses': 0}
+    backend_stats = {}  # backend -> this call's calls, latency, tokens and cost
+    if summary_stats is not None:
+        summary_stats.update(cache=cache_stats, backends=backend_stats)
+    
+    health = load_summarizer_health()
+    chain = summarizer_chain(health)
+    if not chain:
+        return list(islice(articles, limit))  # Return articles without AI summaries
+    primary = chain[0]
+    batch_size = max(1, primary.batch_size)
+    
+    print(f"Processing up to {limit} articles with {' → '.join(backend.name for backend in chain)} "
+          f"({primary.workers} workers, batch size {batch_size})...")
+    
+    # Process 10-12 articles for better coverage with 6 RSS feeds
+    articles_to_process = []
+    cache_keys = []
+    cached_summaries = {}
+    new_summaries = {}  # index -> (summary, backend)
+    extracted = set()  # Indexes prompted with full-article text
+    unextracted = set()  # Indexes whose page download failed this time; their summaries aren't cached
+    calls = []  # (backend, succeeded, latency, usage, cost) for the health records
+    calls_lock = threading.Lock()
+    
+    def article_excerpts(indexes):
+        """{index: excerpt} of the linked pages, when extraction is on and it worked"""
+        if not ARTICLE_EXTRACTION:
+            return {}
+        try:
+            found = extract_article_texts([articles_to_process[i] for i in indexes], deadline=deadline)
+        except Exception as e:
+            print(f"Article extraction failed: {e}")
+            unextracted.update(indexes)
+            return {}
+        unextracted.update(i for i, excerpt in zip(indexes, found) if excerpt is None)
+        excerpts = {i: excerpt for i, excerpt in zip(indexes, found) if excerpt}
+        extracted.update(excerpts)
+        return excerpts
+    
+    def call_backend(backend, indexes, excerpts):
+        """{index: summary} from one backend call; failures are logged and counted"""
+        usage = {}
+        started = time.time()
+        summaries = {}
+        with span('summarizer.call', backend=backend.name, articles=len(indexes)) as call_span:
+            try:
+                if len(indexes) > 1:
+                    reply = backend.summarize_batch([(i, articles_to_process[i]) for i in indexes], excerpts,
+                                                    deadline=deadline, usage=usage)
+                else:
+                    reply = {indexes[0]: backend.summarize(articles_to_process[indexes[0]], excerpts.get(indexes[0]),
+                                                           deadline=deadline, usage=usage)}
+                summaries = {i: text for i, text in reply.items() if i in indexes and text and len(text) > 50}
+                succeeded = True
+            except SummarizerRefused as e:
+                # Out of time or local quota: the backend was never asked, so its health is untouched
+                call_span.set(refused=str(e))
+                succeeded = None
             except Exception as e:
-                print(f"Error summarizing article {i+1}: {e}")
-                enhanced_article = article.copy()
-                enhanced_article['ai_summary'] = create_quick_fallback_summary(article)
-                summarized_articles.append(enhanced_article)
+                call_span.error = f"{type(e).__name__}: {e}"[:300]
+                label = f"batch {[i + 1 for i in indexes]}" if len(indexes) > 1 else f"article {indexes[0] + 1}"
+                print(f"Error summarizing {label} with {backend.name}: {e}")
+                succeeded = False
+            cost = backend.cost(usage)
+            call_span.set(summaries=len(summaries), cost_usd=round(cost, 6))
         
-        ai_time = time.time() - start_time
-        print(f"AI summarization completed in {ai_time:.2f}s for {len(summarized_articles)} articles")
-        return summarized_articles
+        with calls_lock:
+            stats = backend_stats.setdefault(backend.name, {'calls': 0, 'failures': 0, 'refused': 0, 'summaries': 0,
+                                                             'latencies': [], 'prompt_tokens': 0,
+                                                             'reply_tokens': 0, 'cost_usd': 0.0})
+            if succeeded is None:
+                stats['refused'] += 1
+                return summaries
+            calls.append((backend.name, succeeded, time.time() - started, usage, cost))
+            stats['calls'] += 1
+            stats['failures'] += 0 if succeeded else 1
+            stats['summaries'] += len(summaries)
+            stats['latencies'].append(round(time.time() - started, 3))
+            stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            stats['reply_tokens'] += usage.get('reply_tokens', 0)
+            stats['cost_usd'] += cost
+        return summaries
+    
+    def summarize_through_chain(indexes):
+        """{index: (summary, backend)}; what one backend misses falls through to the next"""
+        excerpts = article_excerpts(indexes)
+        summaries = {}
+        remaining = list(indexes)
+        for backend in chain:
+            if not remaining or (deadline is not None and time.time() >= deadline):
+                break
+            if backend.batch_size > 1 and len(remaining) > 1:
+                found = call_backend(backend, remaining, excerpts)
+                print(f"✅ Batch of {len(remaining)} ({backend.name}): {len(found)} summaries parsed")
+            else:
+                found = {}
+                for i in remaining:
+                    found.update(call_backend(backend, [i], excerpts))
+                    if i in found:
+                        print(f"✅ {i+1}/{limit} ({backend.name}): {articles_to_process[i]['title'][:40]}...")
+            summaries.update((i, (text, backend)) for i, text in found.items())
+            remaining = [i for i in remaining if i not in found]
+        return summaries
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, primary.workers))
+    futures = []
+    try:
+        batch = []
         
-    except Exception as e:
-        print(f"Gemini AI error: {e}")
-        # Quick fallback articles
-        fallback_articles = []
-        for article in articles[:12]:
-            enhanced_article = article.copy()
-            enhanced_article['ai_summary'] = create_quick_fallback_summary(article)
-            fallback_articles.append(enhanced_article)
-        return fallback_articles
+        for i, article in enumerate(islice(articles, limit)):
+            articles_to_process.append(article)
+            cache_key = summary_cache_key(article, primary.model_name)
+            cache_keys.append(cache_key)
+            
+            # Cache hits skip the network entirely; only misses are sent to the backends
+            cached_summaries.update(load_cached_summaries([cache_key]))
+            if cache_key in cached_summaries:
+                cache_stats['hits'] += 1
+                continue
+            cache_stats['misses'] += 1
+            
+            if deadline is not None and time.time() >= deadline:
+                continue
+            batch.append(i)
+            if len(batch) >= batch_size:
+                futures.append(executor.submit(with_trace_context(summarize_through_chain), batch))
+                batch = []
+        
+        if batch:
+            futures.append(executor.submit(with_trace_context(summarize_through_chain), batch))
+        
+        # Past the deadline, whatever is still pending falls back instead of waiting
+        done, not_done = wait(futures, timeout=None if deadline is None else max(0, deadline - time.time()))
+        if not_done:
+            print(f"⏱️ Summarization deadline reached: {len(not_done)} AI calls abandoned, using fallbacks")
+        for future in done:
+            new_summaries.update(future.result())
+    finally:
+        # Don't block on stragglers; each one is bounded by its own call timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    # Summaries are set on the records themselves, in article order; failures get
+    # the quick fallback (never cached, so the next run retries the AI)
+    for i, article in enumerate(articles_to_process):
+        article['ai_summary'] = (cached_summaries.get(cache_keys[i]) or new_summaries.get(i, (None,))[0]
+                                 or create_quick_fallback_summary(article))
+    summarized_articles = articles_to_process
+    
+    # Only the preferred backend's summaries are cached: a story that failed over
+    # is tried with the preferred backend again next time, and so is one written
+    # from the teaser because its page couldn't be downloaded
+    save_cached_summaries({cache_keys[i]: summary for i, (summary, backend) in new_summaries.items()
+                           if backend is primary and i not in unextracted})
+    with calls_lock:
+        record_summarizer_health(health, list(calls))
+    current_span().set(articles=len(summarized_articles), cache_hits=cache_stats['hits'],
+                       cache_misses=cache_stats['misses'], ai_calls=len(calls),
+                       excerpts=len(extracted), backends=[backend.name for backend in chain],
+                       fallbacks=sum(1 for i, key in enumerate(cache_keys)
+                                     if key not in cached_summaries and i not in new_summaries))
+    
+    ai_time = time.time() - start_time
+    print(f"AI summarization completed in {ai_time:.2f}s for {len(summarized_articles)} articles "
+          f"({cache_stats['hits']} cached, {len(extracted)} with full-article text)")
+    return summarized_articles
+
+def summarizer_run_report(summary_stats):
+    """Per-backend calls, failures, latency, tokens and cost from a summarize_with_gemini() `summary_stats`"""
+    return {name: {
+        'calls': stats['calls'],
+        'failures': stats['failures'],
+        'refused': stats['refused'],
+        'summaries': stats['summaries'],
+        'p50_latency_s': percentile(stats['latencies'], 0.5) if stats['latencies'] else None,
+        'p95_latency_s': percentile(stats['latencies'], 0.95) if stats['latencies'] else None,
+        'tokens': stats['prompt_tokens'] + stats['reply_tokens'],
+        'cost_usd': round(stats['cost_usd'], 6)
+    } for name, stats in summary_stats.get('backends', {}).items()}
 
 def create_quick_fallback_summary(article):
     """Create fast fallback summary for speed optimization"""
@@ -239,8 +2576,7 @@ def create_detailed_fallback_summary(article):
     if original_summary and len(original_summary) > 100:
         # Clean and use the original summary
         # Remove HTML tags if present
-        import re
-        clean_summary = re.sub(r'<[^>]+>', '', original_summary)
+        clean_summary = clean_html_text(original_summary)
         
         # Split into sentences and take the most informative ones
         sentences = clean_summary.split('. ')
@@ -276,75 +2612,20 @@ def create_fallback_summary(article):
     """Legacy fallback - redirects to detailed version"""
     return create_detailed_fallback_summary(article)
 
-def create_daily_email(articles):
-    """Create clean, professional email template"""
-    current_date = datetime.utcnow().strftime("%B %d, %Y")
-    weekday = datetime.utcnow().strftime("%A")
-    
-    # Create articles HTML
-    articles_html = ""
-    
-    for i, article in enumerate(articles, 1):
-        # Clean and format article data
-        title = article.get('title', 'Untitled Article').strip()
-        link = article.get('link', '#').strip()
-        source = article.get('source', 'Unknown Source').strip()
-        
-        # Format the article date
-        article_date = article.get('date')
-        if article_date:
-            if hasattr(article_date, 'strftime'):
-                date_str = article_date.strftime("%B %d, %Y")
-            else:
-                date_str = str(article_date)
-        else:
-            date_str = "Date not available"
-        
-        # Get AI summary and clean it
-        summary_text = article.get('ai_summary', '')
-        if not summary_text:
-            summary_text = "This article covers important developments in artificial intelligence and technology that are shaping the industry today."
-        
-        # Clean summary text - remove markdown formatting but keep content readable
-        summary_text = summary_text.replace('**', '').replace('*', '').strip()
-        
-        # Ensure summary is concise but informative
-        if len(summary_text) > 500:
-            sentences = summary_text.split('. ')
-            summary_text = '. '.join(sentences[:3]) + '.'
-        
-        articles_html += f"""
-        <div style="margin-bottom: 30px; padding-bottom: 20px; border-bottom: 1px solid #e0e0e0;">
-            <h2 style="color: #333333; font-size: 18px; font-weight: 600; margin: 0 0 8px 0; line-height: 1.4;">
-                {i}. {title}
-            </h2>
-            
-            <div style="margin-bottom: 15px;">
-                <span style="color: #888888; font-size: 13px; font-weight: 500;">
-                    {date_str} | Source: {source}
-                </span>
-            </div>
-            
-            <p style="color: #666666; font-size: 14px; line-height: 1.6; margin: 0 0 15px 0; text-align: justify;">
-                {summary_text}
-            </p>
-            
-            <p style="margin: 0;">
-                <a href="{link}" style="background-color: #0066cc; color: white; padding: 8px 16px; text-decoration: none; font-size: 13px; font-weight: 500; border-radius: 4px; display: inline-block;">
-                    Read Full Article
-                </a>
-            </p>
-        </div>
-        """
-    
-    # Create clean, professional email
-    return f"""
+# --- Email Rendering ---
+# The layout and article markup are compiled once per process (and minified once,
+# when enabled); rendering a digest is then a join over precomputed literal chunks
+EMAIL_MINIFY = os.getenv("EMAIL_MINIFY", "1") == "1"
+EMAIL_SIZE_BUDGET = int(os.getenv("EMAIL_SIZE_BUDGET", "100000"))  # Gmail clips bodies over 102KB
+EMAIL_FRAGMENT_CACHE_SIZE = 1024
+
+EMAIL_LAYOUT_SOURCE = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>AI Technology News - {weekday}, {current_date}</title>
+    <title>{title} - {weekday}, {current_date}</title>
 </head>
 <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Arial, sans-serif; line-height: 1.6; color: #333333; background-color: #f8f9fa; margin: 0; padding: 20px;">
     
@@ -353,10 +2634,10 @@ def create_daily_email(articles):
         <!-- Header -->
         <div style="background-color: #ffffff; padding: 30px 30px 20px 30px; border-bottom: 2px solid #f0f0f0;">
             <h1 style="color: #2c3e50; font-size: 24px; font-weight: 700; margin: 0 0 8px 0; text-align: center;">
-                AI Technology News
+                {title}
             </h1>
             <p style="color: #7f8c8d; font-size: 16px; margin: 0; text-align: center; font-weight: 500;">
-                {weekday}, {current_date} • {len(articles)} Articles
+                {weekday}, {current_date} • {article_count} Articles
             </p>
         </div>
         
@@ -368,7 +2649,7 @@ def create_daily_email(articles):
         <!-- Footer -->
         <div style="background-color: #f8f9fa; padding: 20px 30px; border-top: 1px solid #e0e0e0; text-align: center;">
             <p style="color: #6c757d; font-size: 12px; margin: 0; line-height: 1.4;">
-                AI-generated summaries • Delivered daily
+                AI-generated summaries • Delivered daily to {{{{ params.email }}}}
             </p>
         </div>
         
@@ -378,167 +2659,1157 @@ def create_daily_email(articles):
 </html>
     """
 
-def send_daily_email(articles):
-    """Send single daily email with all articles"""
+# Split at the article number, so one cached fragment serves any position in any digest
+EMAIL_ARTICLE_PREFIX_SOURCE = """
+        <div style="margin-bottom: 30px; padding-bottom: 20px; border-bottom: 1px solid #e0e0e0;">
+            <h2 style="color: #333333; font-size: 18px; font-weight: 600; margin: 0 0 8px 0; line-height: 1.4;">
+                """
+EMAIL_ARTICLE_SOURCE = """. {title}
+            </h2>
+            
+            <div style="margin-bottom: 15px;">
+                <span style="color: #888888; font-size: 13px; font-weight: 500;">
+                    {date_str} | Source: {source}
+                </span>
+            </div>
+            
+            <p style="color: #666666; font-size: 14px; line-height: 1.6; margin: 0 0 15px 0; text-align: justify;">
+                {summary_text}
+            </p>
+            
+            <p style="margin: 0;">
+                <a href="{link}" style="background-color: #0066cc; color: white; padding: 8px 16px; text-decoration: none; font-size: 13px; font-weight: 500; border-radius: 4px; display: inline-block;">
+                    Read Full Article
+                </a>
+            </p>
+        </div>
+        """
+
+def minify_html(source):
+    """Drop comments, indentation and whitespace between tags"""
+    source = re.sub(r'<!--.*?-->', '', source, flags=re.S)
+    source = re.sub(r'\s*\n\s*', '\n', source)
+    source = re.sub(r'>\s+', '>', source)
+    return re.sub(r'\s+<', '<', source).strip()
+
+class EmailTemplate:
+    """A str.format-style template parsed once into literal chunks and field names"""
+    
+    def __init__(self, source, minify=EMAIL_MINIFY):
+        from string import Formatter
+        
+        if minify:
+            source = minify_html(source)
+        self.parts = [(literal, field) for literal, field, _, _ in Formatter().parse(source)]
+    
+    def render(self, **values):
+        chunks = []
+        for literal, field in self.parts:
+            chunks.append(literal)
+            if field is not None:
+                chunks.append(values[field])
+        return ''.join(chunks)
+
+EMAIL_LAYOUT = EmailTemplate(EMAIL_LAYOUT_SOURCE)
+EMAIL_ARTICLE = EmailTemplate(EMAIL_ARTICLE_SOURCE)
+EMAIL_ARTICLE_PREFIX = minify_html(EMAIL_ARTICLE_PREFIX_SOURCE) if EMAIL_MINIFY else EMAIL_ARTICLE_PREFIX_SOURCE
+
+def escape_email_text(text):
+    """HTML-escape feed/AI text; braces too, so Brevo's {{ params }} templating leaves it alone"""
+    from html import escape
+    
+    return escape(text).replace('{', '&#123;').replace('}', '&#125;')
+
+@lru_cache(maxsize=EMAIL_FRAGMENT_CACHE_SIZE)
+def render_article_fragment(title, link, source, date_str, summary_text, summary_sentences=None):
+    """Markup for one article after its number, cached on its content (summary included)"""
+    if not summary_text:
+        summary_text = "This article covers important developments in artificial intelligence and technology that are shaping the industry today."
+    
+    # Clean summary text - remove markdown formatting but keep content readable
+    summary_text = summary_text.replace('**', '').replace('*', '').strip()
+    
+    # Ensure summary is concise but informative
+    if len(summary_text) > 500:
+        sentences = summary_text.split('. ')
+        summary_text = '. '.join(sentences[:3]) + '.'
+    
+    # Shorter profiles (e.g. an executive digest) reuse the same summary, trimmed
+    if summary_sentences:
+        sentences = summary_text.split('. ')
+        if len(sentences) > summary_sentences:
+            summary_text = '. '.join(sentences[:summary_sentences]).rstrip('.') + '.'
+    
+    return EMAIL_ARTICLE.render(
+        title=escape_email_text(title),
+        link=escape_email_text(link),
+        source=escape_email_text(source),
+        date_str=escape_email_text(date_str),
+        summary_text=escape_email_text(summary_text)
+    )
+
+def article_fragment(article, summary_sentences=None):
+    # Clean and format article data
+    title = article.get('title', 'Untitled Article').strip()
+    link = article.get('link', '#').strip()
+    source = article.get('source', 'Unknown Source').strip()
+    if article.get('also_covered_by'):
+        source += f" (also covered by {', '.join(article['also_covered_by'])})"
+    
+    # Format the article date
+    article_date = article.get('date')
+    if article_date:
+        if hasattr(article_date, 'strftime'):
+            date_str = article_date.strftime("%B %d, %Y")
+        else:
+            date_str = str(article_date)
+    else:
+        date_str = "Date not available"
+    
+    return render_article_fragment(title, link, source, date_str, article.get('ai_summary', ''), summary_sentences)
+
+@traced('digest.render')
+def render_digest(articles, profile=None, now=None, size_budget=EMAIL_SIZE_BUDGET):
+    """Render one digest's HTML body and subject from a single timestamp
+    
+    Returns {'html', 'subject', 'articles' (how many fit), 'bytes', 'render_ms',
+    'fragment_hits'}. While the body is over `size_budget` bytes, trailing
+    (lowest-ranked) articles are left out; None disables the budget.
+    """
+    import time
+    
+    start_time = time.perf_counter()
+    profile = profile or DEFAULT_DIGEST_PROFILE
+    now = now or datetime.utcnow()
+    current_date = now.strftime("%B %d, %Y")
+    weekday = now.strftime("%A")
+    title = escape_email_text(profile['title'])
+    
+    hits_before = render_article_fragment.cache_info().hits
+    fragments = [article_fragment(article, profile.get('summary_sentences')) for article in articles]
+    fragment_hits = render_article_fragment.cache_info().hits - hits_before
+    
+    def build(count):
+        return EMAIL_LAYOUT.render(
+            title=title,
+            weekday=weekday,
+            current_date=current_date,
+            article_count=str(count),
+            articles_html=''.join([f"{EMAIL_ARTICLE_PREFIX}{i}{fragment}"
+                                   for i, fragment in enumerate(fragments[:count], 1)])
+        )
+    
+    count = len(fragments)
+    html_content = build(count)
+    body_bytes = len(html_content.encode('utf-8'))
+    if size_budget is not None and body_bytes > size_budget and count > 1:
+        while count > 1 and body_bytes > size_budget:
+            body_bytes -= len(EMAIL_ARTICLE_PREFIX) + len(str(count)) + len(fragments[count - 1].encode('utf-8'))
+            count -= 1
+        html_content = build(count)
+        body_bytes = len(html_content.encode('utf-8'))
+    
+    current_span().set(profile=profile['id'], articles=count, bytes=body_bytes, fragment_hits=fragment_hits)
+    return {
+        'html': html_content,
+        'subject': f"{profile['title']} - {weekday}, {current_date} ({count} articles)",
+        'articles': count,
+        'bytes': body_bytes,
+        'render_ms': (time.perf_counter() - start_time) * 1000,
+        'fragment_hits': fragment_hits
+    }
+
+def create_daily_email(articles, profile=None):
+    """Create clean, professional email template (title and summary length from the digest profile)"""
+    return render_digest(articles, profile, size_budget=None)['html']
+
+def send_daily_email(articles, timeout=None, profile=None, rendered=None):
+    """Send one digest to every recipient of a profile and return per-recipient status
+    
+    `profile` picks the title and recipient list; the default profile sends to
+    RECIPIENT_EMAILS as a single-digest setup always has. `rendered` is a
+    render_digest() result to reuse, and `timeout` bounds the whole delivery.
+    Raises only when no recipient was accepted.
+    """
+    profile = profile or DEFAULT_DIGEST_PROFILE
     brevo_key = os.getenv("BREVO_API_KEY")
     sender_email = os.getenv("SENDER_EMAIL")
-    recipient_emails_str = os.getenv("RECIPIENT_EMAILS")
+    recipient_emails = digest_recipients(profile)
 
-    if not all([brevo_key, sender_email, recipient_emails_str]):
+    if not all([brevo_key, sender_email, recipient_emails]):
         raise ValueError("Email environment variables not fully set.")
 
-    configuration = sib_api_v3_sdk.Configuration()
-    configuration.api_key['api-key'] = brevo_key
-    api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
-
     sender = {"email": sender_email}
-    recipients = [{"email": email.strip()} for email in recipient_emails_str.split(',')]
     
-    # Create daily email content with all articles
-    html_content = create_daily_email(articles)
+    # Body and dynamic subject line (date and article count) come from one render
+    rendered = rendered or render_digest(articles, profile)
+    
+    statuses = send_bulk_email(recipient_emails, rendered['subject'], rendered['html'], sender, brevo_key,
+                               timeout=timeout)
+    failed = {email: status for email, status in statuses.items() if status['status'] != 'sent'}
+    if len(failed) == len(statuses):
+        first_error = next(iter(failed.values()))['error']
+        raise RuntimeError(f"No recipient accepted ({len(failed)} failed, e.g. {first_error})")
+    if failed:
+        print(f"⚠️ {len(failed)}/{len(statuses)} recipients failed: "
+              + ", ".join(f"{email} ({status['error']})" for email, status in list(failed.items())[:5]))
+    return statuses
+
+# --- Bulk Email Delivery ---
+# Every recipient gets their own message version, so nobody sees anyone else's
+# address and a bad address only fails its own version. Brevo accepts at most
+# 1000 versions per call.
+BREVO_API_URL = os.getenv("BREVO_API_URL", "")  # Alternative API host, e.g. bench/mock_brevo.py
+BREVO_BATCH_SIZE = max(1, min(int(os.getenv("BREVO_BATCH_SIZE", "1000")), 1000))
+BREVO_SEND_CONCURRENCY = int(os.getenv("BREVO_SEND_CONCURRENCY", "4"))
+BREVO_MAX_RETRIES = int(os.getenv("BREVO_MAX_RETRIES", "3"))
+EMAIL_ADDRESS_PATTERN = re.compile(r"^[^@\s,;<>]+@[^@\s,;<>]+\.[^@\s,;<>]+$")
+
+_brevo_apis = {}
+_brevo_apis_lock = threading.Lock()
+
+def brevo_email_api(api_key):
+    """One pooled TransactionalEmailsApi per key, reused by every send in the process"""
+    import sib_api_v3_sdk
+    
+    with _brevo_apis_lock:
+        api_instance = _brevo_apis.get(api_key)
+        if api_instance is None:
+            configuration = sib_api_v3_sdk.Configuration()
+            configuration.api_key['api-key'] = api_key
+            if BREVO_API_URL:
+                configuration.host = BREVO_API_URL.rstrip('/')
+            # One keep-alive connection per concurrent chunk
+            configuration.connection_pool_maxsize = max(1, BREVO_SEND_CONCURRENCY)
+            api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
+            _brevo_apis[api_key] = api_instance
+        return api_instance
+
+def is_retryable_brevo_error(error):
+    """True for rate limiting (429), transient server-side (5xx) and connections that never reached Brevo
     
-    # Create dynamic subject line with date and article count (changes daily)
-    current_date = datetime.utcnow().strftime("%B %d, %Y")
-    weekday = datetime.utcnow().strftime("%A")
-    subject = f"AI Technology News - {weekday}, {current_date} ({len(articles)} articles)"
+    Sending is not idempotent: after a read timeout or a dropped response Brevo may
+    already have accepted the chunk, and a retry would deliver it twice.
+    """
+    from sib_api_v3_sdk.rest import ApiException
+    from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
     
-    send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
-        to=recipients,
-        html_content=html_content,
-        sender=sender,
-        subject=subject
-    )
+    if isinstance(error, ApiException):
+        return error.status == 429 or (isinstance(error.status, int) and error.status >= 500)
+    if isinstance(error, MaxRetryError):
+        error = error.reason
+    return isinstance(error, (ConnectTimeoutError, NewConnectionError))
+
+BREVO_RECIPIENT_ERROR = re.compile(r'\b(email|recipient|to)\b.*\b(not valid|invalid)\b|\binvalid\b.*\b(email|recipient)',
+                                   re.IGNORECASE)
+
+def is_recipient_rejection(error):
+    """True for a 400 that blames recipient addresses, as opposed to the sender, subject or body"""
+    from sib_api_v3_sdk.rest import ApiException
+    
+    if not isinstance(error, ApiException) or error.status != 400:
+        return False
+    message = brevo_error_message(error)
+    return 'sender' not in message.lower() and bool(BREVO_RECIPIENT_ERROR.search(message))
+
+def brevo_error_message(error):
+    from sib_api_v3_sdk.rest import ApiException
+    
+    if isinstance(error, ApiException):
+        try:
+            return f"{error.status}: {json.loads(error.body)['message']}"
+        except Exception:
+            return f"{error.status}: {error.reason}"
+    return str(error) or type(error).__name__
+
+@traced('email.send')
+def send_bulk_email(recipients, subject, html_content, sender, api_key, timeout=None):
+    """Send one personalized message version per recipient in chunked batch calls
+    
+    Returns {email: {'status': 'sent', 'message_id': ...}} or
+    {email: {'status': 'invalid' | 'failed', 'error': ...}} for every recipient.
+    Chunks go out concurrently over one pooled client; 429/5xx and failed connections
+    are retried with backoff inside `timeout` (read timeouts are not: Brevo may have
+    sent the chunk). A chunk rejected as a whole for an invalid recipient (400) is
+    split in half until the bad addresses are isolated; any other 400 fails the chunk. `{{ params.email }}` in the
+    HTML is replaced with each recipient's own address.
+    """
+    import random
+    import time
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    import sib_api_v3_sdk
+    from sib_api_v3_sdk.rest import ApiException
+    
+    deadline = None if timeout is None else time.time() + timeout
+    api_instance = brevo_email_api(api_key)
+    
+    statuses = {}
+    valid_recipients = []
+    for email in dict.fromkeys(recipients):
+        if EMAIL_ADDRESS_PATTERN.match(email):
+            valid_recipients.append(email)
+        else:
+            statuses[email] = {'status': 'invalid', 'error': "malformed address"}
+    
+    def send_chunk(chunk, chunk_span):
+        send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
+            sender=sender,
+            subject=subject,
+            html_content=html_content,
+            message_versions=[{'to': [{'email': email}], 'params': {'email': email}} for email in chunk]
+        )
+        for attempt in range(BREVO_MAX_RETRIES + 1):
+            request_options = {}
+            if deadline is not None:
+                request_options['_request_timeout'] = deadline - time.time()
+                if request_options['_request_timeout'] <= 0:
+                    raise TimeoutError("email send deadline passed")
+            try:
+                return api_instance.send_transac_email(send_smtp_email, **request_options)
+            except Exception as e:
+                if attempt >= BREVO_MAX_RETRIES or not is_retryable_brevo_error(e):
+                    raise
+                delay = min(2 ** attempt, 16) + random.uniform(0, 0.5)
+                if deadline is not None and time.time() + delay >= deadline:
+                    raise
+                chunk_span.set(retries=attempt + 1)
+                print(f"Brevo retry {attempt + 1}/{BREVO_MAX_RETRIES} for {len(chunk)} recipients in {delay:.1f}s: "
+                      f"{brevo_error_message(e)}")
+                time.sleep(delay)
+    
+    def deliver(chunk):
+        """Return (statuses, halves to retry) for one chunk; a chunk Brevo rejects as a whole is split"""
+        with span('brevo.send_chunk', recipients=len(chunk), retries=0) as chunk_span:
+            try:
+                response = send_chunk(chunk, chunk_span)
+            except ApiException as e:
+                chunk_span.set(status=e.status)
+                if is_recipient_rejection(e) and len(chunk) > 1:
+                    chunk_span.set(split=True)
+                    middle = len(chunk) // 2
+                    return {}, [chunk[:middle], chunk[middle:]]
+                chunk_span.error = brevo_error_message(e)
+                return {email: {'status': 'failed', 'error': brevo_error_message(e)} for email in chunk}, []
+            except Exception as e:
+                chunk_span.error = brevo_error_message(e)
+                return {email: {'status': 'failed', 'error': brevo_error_message(e)} for email in chunk}, []
+        
+        # messageIds come back in message-version order
+        message_ids = response.message_ids or [response.message_id] * len(chunk)
+        return {email: {'status': 'sent', 'message_id': message_ids[i] if i < len(message_ids) else None}
+                for i, email in enumerate(chunk)}, []
+    
+    # Split halves go back into the same pool, so isolating bad addresses in one
+    # chunk doesn't hold up the others
+    executor = ThreadPoolExecutor(max_workers=max(1, BREVO_SEND_CONCURRENCY))
+    try:
+        pending = {executor.submit(with_trace_context(deliver), valid_recipients[i:i + BREVO_BATCH_SIZE])
+                   for i in range(0, len(valid_recipients), BREVO_BATCH_SIZE)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk_statuses, retry_chunks = future.result()
+                statuses.update(chunk_statuses)
+                pending.update(executor.submit(with_trace_context(deliver), retry_chunk)
+                               for retry_chunk in retry_chunks)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    sent = sum(1 for status in statuses.values() if status['status'] == 'sent')
+    current_span().set(recipients=len(statuses), sent=sent, failed=len(statuses) - sent)
+    return statuses
+
+# --- Run Budget ---
+RUN_BUDGET_SECONDS = float(os.getenv("RUN_BUDGET_SECONDS", "270"))  # Headroom under vercel.json's maxDuration of 300s
+SEND_RESERVE_SECONDS = float(os.getenv("SEND_RESERVE_SECONDS", "30"))  # Always kept back for render + send
+
+class RunBudget:
+    """Wall-clock budget for one run, sliced into per-stage deadlines
+    
+    Fetching gets the first FEED_FETCH_TIMEOUT seconds, summarization runs until the
+    send reserve begins, and rendering plus sending always keep the reserve, so a
+    slow Gemini day degrades to fallback summaries instead of timing out with no email.
+    """
+    
+    def __init__(self, total=RUN_BUDGET_SECONDS, send_reserve=SEND_RESERVE_SECONDS, start=None):
+        import time
+        
+        self.start = start or time.time()
+        self.end = self.start + total
+        self.send_reserve = min(send_reserve, total)
+    
+    def remaining(self):
+        import time
+        
+        return max(0.0, self.end - time.time())
+    
+    def summarize_deadline(self):
+        return self.end - self.send_reserve
+    
+    def fetch_deadline(self):
+        return min(self.start + FEED_FETCH_TIMEOUT, self.summarize_deadline())
+    
+    # Never less than a few seconds: an email sent slightly late beats none at all
+    MIN_SEND_SECONDS = 5.0
+    
+    def send_timeout(self):
+        return max(self.MIN_SEND_SECONDS, self.remaining())
+    
+    def can_send(self):
+        """False once another send could run past the budget"""
+        return self.remaining() >= self.MIN_SEND_SECONDS
+
+# --- Daily Pipeline ---
+@traced('pipeline.run', root=True)
+def run_daily_pipeline(on_step=None, resend=False):
+    """Run fetch → summarize → email once and return an outcome summary
+    
+    `on_step(step, state, duration)` is called as each step starts ('running') and
+    finishes ('done' or 'failed'), so background jobs can report progress. Digest
+    profiles already delivered today are skipped unless `resend` is set. The
+    returned dict has 'outcome' ('sent', 'no_articles' or 'email_failed'), a
+    human-readable 'message', 'articles', 'trace_id' (see /metrics), per-profile 'digests' status,
+    'recipient_failures' ({email: error}), per-profile 'renders' (bytes and
+    render_ms), per-backend 'summarizers' (calls, latency, tokens and cost),
+    'step_times' and 'total_time'.
+    """
+    import time
+    
+    def report(step, state, duration=None):
+        if on_step is not None:
+            on_step(step, state, duration)
+    
+    # Performance monitoring
+    start_time = time.time()
+    step_times = {}
+    budget = RunBudget(start=start_time)
+    run_span = current_span()
+    run_span.set(resend=resend, profiles=len(DIGEST_PROFILES))
+    # One timestamp for the whole run, so a digest straddling midnight keeps one date
+    run_time = datetime.utcnow()
+    run_date = run_time.date()
+    
+    print(f"🚀 Starting optimized AI News automation at {run_time.isoformat()}")
+    print(f"🎯 Target execution time: <200 seconds (hard budget {RUN_BUDGET_SECONDS:.0f}s, "
+          f"{budget.send_reserve:.0f}s reserved for sending)")
+    
+    # Steps 1-2: Streaming pipeline - articles are summarized as soon as their
+    # feed returns, so total time approaches max(fetch, summarize)
+    step_start = time.time()
+    fetch_stats = {}
+    articles = []
+    article_stream = stream_news_articles(fetch_stats, deadline=budget.fetch_deadline())
+    
+    def record_arrivals(stream):
+        for article in stream:
+            articles.append(article)
+            yield article
+    
+    # One fetch and one summary pass feed every digest profile; with ranking off and a
+    # single profile, articles are summarized as they stream in instead. Profiles
+    # nobody receives are dropped before selection, so they cost no Gemini calls
+    profiles = DIGEST_PROFILES
+    deliveries = {}
+    if len(profiles) > 1:
+        for profile in profiles:
+            if not digest_recipients(profile):
+                print(f"⏭️ Digest '{profile['id']}' skipped: {profile['recipients_env']} is not set")
+                deliveries[profile['id']] = 'no_recipients'
+        profiles = [profile for profile in profiles if profile['id'] not in deliveries]
+    if not profiles:
+        total_time = time.time() - start_time
+        error_msg = f"Email failed after {total_time:.1f}s: no digest had recipients"
+        print(f"❌ {error_msg}")
+        run_span.set(outcome='email_failed', articles=0)
+        return {'outcome': 'email_failed', 'message': error_msg, 'articles': 0,
+                'trace_id': run_span.trace.trace_id, 'digests': deliveries, 'step_times': step_times,
+                'total_time': total_time}
+    digests = {}
+    summary_stats = {}
+    report('fetch_and_summarize', 'running')
+    try:
+        if RANKING_ENABLED or len(profiles) > 1:
+            # Selection needs every candidate, so summarization waits for the fetch to
+            # finish; LLM calls then go to the best stories instead of the first ones
+            print(f"📰 [STEP 1-2/3] Fetching RSS feeds, selecting articles for {len(profiles)} digest(s), then summarizing...")
+            candidates = list(record_arrivals(article_stream))
+            rank_start = time.time()
+            selections = {profile['id']: select_digest_articles(candidates, profile) for profile in profiles}
+            step_times['ranking'] = time.time() - rank_start
+            print(f"✅ Selected from {len(candidates)} candidates in {step_times['ranking'] * 1000:.1f}ms")
+            
+            # Articles picked by several profiles are summarized once; the summary is
+            # set on the shared record, so every selection sees it
+            selected = list({id(article): article for selection in selections.values()
+                             for article in selection}.values())
+            summarized_articles = summarize_with_gemini(selected, limit=len(selected),
+                                                        deadline=budget.summarize_deadline(),
+                                                        summary_stats=summary_stats)
+            digests = selections
+        else:
+            print("📰 [STEP 1-2/3] Fetching RSS feeds and summarizing articles as they arrive...")
+            summarized_articles = summarize_with_gemini(record_arrivals(article_stream),
+                                                        limit=profiles[0]['max_articles'],
+                                                        deadline=budget.summarize_deadline(),
+                                                        summary_stats=summary_stats)
+            digests = {profiles[0]['id']: summarized_articles}
+        step_times['ai_processing'] = time.time() - step_start
+        print(f"✅ AI: {len(summarized_articles)} summaries in {step_times['ai_processing']:.1f}s")
+            
+    except Exception as e:
+        step_times['ai_processing'] = time.time() - step_start
+        print(f"⚠️ AI failed in {step_times['ai_processing']:.1f}s, using fallbacks: {e}")
+        for profile in profiles:
+            pool = [article for article in articles
+                    if not profile.get('sources') or article.get('source') in profile['sources']]
+            digests[profile['id']] = pool[:profile['max_articles']]
+            for article in digests[profile['id']]:
+                article['ai_summary'] = create_quick_fallback_summary(article)
+        summarized_articles = list({id(article): article for digest in digests.values()
+                                    for article in digest}.values())
+    finally:
+        article_stream.close()
+        step_times['rss_fetch'] = fetch_stats.get('fetch_time', step_times['ai_processing'])
+        print(f"✅ RSS: {fetch_stats.get('articles', len(articles))} articles in {step_times['rss_fetch']:.1f}s")
+    report('fetch_and_summarize', 'done', step_times['ai_processing'])
+    
+    if not summarized_articles:
+        total_time = time.time() - start_time
+        print(f"❌ No articles found in {total_time:.1f}s")
+        run_span.set(outcome='no_articles', articles=0)
+        return {'outcome': 'no_articles', 'message': "No articles found today.", 'articles': 0,
+                'trace_id': run_span.trace.trace_id, 'step_times': step_times, 'total_time': total_time}
+    
+    # Step 3: Email Delivery - one render and send per digest profile
+    step_start = time.time()
+    report('email_send', 'running')
+    sent_articles = {}
+    failures = []
+    recipient_failures = {}
+    renders = {}
+    already_delivered = set() if resend else delivered_digests(run_date)
+    print(f"📧 [STEP 3/3] Sending {len(profiles)} digest(s) ({len(summarized_articles)} unique articles)...")
+    for profile in profiles:
+        digest_articles = digests.get(profile['id'], [])
+        if not digest_articles:
+            deliveries[profile['id']] = 'empty'
+            continue
+        if profile['id'] in already_delivered:
+            print(f"⏭️ Digest '{profile['id']}' already sent today")
+            deliveries[profile['id']] = 'already_sent'
+            continue
+        try:
+            rendered = render_digest(digest_articles, profile, now=run_time)
+            renders[profile['id']] = {'bytes': rendered['bytes'], 'render_ms': round(rendered['render_ms'], 2)}
+            print(f"🖋️ Rendered '{profile['id']}': {rendered['articles']} articles, {rendered['bytes'] / 1024:.1f}KB "
+                  f"in {rendered['render_ms']:.1f}ms ({rendered['fragment_hits']} cached fragments)")
+            if rendered['articles'] < len(digest_articles):
+                print(f"⚠️ Digest '{profile['id']}' over the {EMAIL_SIZE_BUDGET // 1000}KB size budget: "
+                      f"last {len(digest_articles) - rendered['articles']} articles left out")
+                digest_articles = digest_articles[:rendered['articles']]
+            
+            statuses = send_daily_email(digest_articles, timeout=budget.send_timeout(), profile=profile,
+                                        rendered=rendered)
+            deliveries[profile['id']] = 'sent'
+            record_digest_delivery(profile['id'], len(digest_articles), run_date)
+            for article in digest_articles:
+                sent_articles.setdefault(article['link'], article)
+            for email, status in (statuses or {}).items():
+                if status['status'] != 'sent':
+                    recipient_failures[email] = status['error']
+            print(f"✅ Digest '{profile['id']}' sent ({len(digest_articles)} articles, "
+                  f"{len(statuses or ())} recipients)")
+        except Exception as e:
+            deliveries[profile['id']] = 'failed'
+            failures.append(f"{profile['id']}: {str(e)}")
+            print(f"❌ Digest '{profile['id']}' failed: {e}")
+    step_times['email_send'] = time.time() - step_start
+    step_times['render'] = sum(render['render_ms'] for render in renders.values()) / 1000
+    
+    if sent_articles:
+        record_sent_articles(list(sent_articles.values()), run_date)
+        archive_digest(list(sent_articles.values()), run_date)
+    
+    if failures or not {'sent', 'already_sent'} & set(deliveries.values()):
+        report('email_send', 'failed', step_times['email_send'])
+        total_time = time.time() - start_time
+        error_msg = f"Email failed after {total_time:.1f}s: {'; '.join(failures) or 'no digest had recipients'}"
+        print(f"❌ {error_msg}")
+        run_span.set(outcome='email_failed', articles=len(sent_articles))
+        return {'outcome': 'email_failed', 'message': error_msg, 'articles': len(sent_articles),
+                'trace_id': run_span.trace.trace_id,
+                'digests': deliveries, 'recipient_failures': recipient_failures, 'renders': renders,
+                'summarizers': summarizer_run_report(summary_stats), 'step_times': step_times, 'total_time': total_time}
+    report('email_send', 'done', step_times['email_send'])
+    
+    # Performance Summary
+    total_time = time.time() - start_time
+    print(f"✅ Email sent in {step_times['email_send']:.1f}s")
+    print(f"")
+    print(f"📊 PERFORMANCE SUMMARY:")
+    print(f"   RSS Fetch:     {step_times.get('rss_fetch', 0):.1f}s (overlapped with AI)")
+    print(f"   Fetch + AI:    {step_times.get('ai_processing', 0):.1f}s")
+    print(f"   Email Send:    {step_times.get('email_send', 0):.1f}s")
+    print(f"   Render:        {step_times.get('render', 0) * 1000:.1f}ms, largest body "
+          f"{max((render['bytes'] for render in renders.values()), default=0) / 1024:.1f}KB "
+          f"(Gmail clips at 102KB)")
+    cache_stats = summary_stats.get('cache', {})
+    print(f"   Summary Cache: {cache_stats.get('hits', 0)} hits / {cache_stats.get('misses', 0)} misses")
+    for name, stats in summarizer_run_report(summary_stats).items():
+        print(f"   Summarizer:    {name} {stats['summaries']} summaries in {stats['calls']} calls "
+              f"({stats['failures']} failed, {stats['refused']} refused, p50 {stats['p50_latency_s'] or 0:.2f}s, "
+              f"{stats['tokens']} tokens, ${stats['cost_usd']:.4f})")
+    print(f"   TOTAL TIME:    {total_time:.1f}s ({budget.remaining():.0f}s of budget left)")
+    
+    # Performance analysis
+    if total_time < 120:
+        print(f"🎯 EXCELLENT: Completed in {total_time:.1f}s (target: <200s)")
+    elif total_time < 200:
+        print(f"✅ GOOD: Completed in {total_time:.1f}s (within target)")
+    else:
+        print(f"⚠️ SLOW: Took {total_time:.1f}s (target: <200s)")
+    
+    success_msg = f"Success! Daily AI news sent ({len(sent_articles)} articles in {len(deliveries)} digest(s)) in {total_time:.1f}s at {datetime.utcnow().isoformat()}."
+    run_span.set(outcome='sent', articles=len(sent_articles))
+    return {'outcome': 'sent', 'message': success_msg, 'articles': len(sent_articles),
+            'trace_id': run_span.trace.trace_id,
+            'digests': deliveries, 'recipient_failures': recipient_failures, 'renders': renders,
+            'summarizers': summarizer_run_report(summary_stats), 'step_times': step_times, 'total_time': total_time}
+
+# --- Backfill Replay ---
+# Rebuilds past days' digests from feed snapshots; 0 uses one ranking process per CPU
+REPLAY_WORKERS = int(os.getenv("REPLAY_WORKERS", "0"))
+REPLAY_MAX_DAYS = 31
+
+def parse_replay_range(date_from, date_to=None):
+    """Validated (start, end) dates for a replay; `date_to` defaults to `date_from`"""
+    start = datetime.strptime(date_from, "%Y-%m-%d").date()
+    end = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else start
+    if end < start:
+        raise ValueError(f"Replay range ends ({end}) before it starts ({start})")
+    if end > datetime.utcnow().date():
+        raise ValueError(f"Cannot replay {end}: it is in the future")
+    if (end - start).days >= REPLAY_MAX_DAYS:
+        raise ValueError(f"Replay range is longer than {REPLAY_MAX_DAYS} days")
+    return start, end
+
+def replay_candidates(snapshots, day):
+    """Articles a run on `day` could have seen: snapshot entries in its window, once per link"""
+    by_link = {}
+    for url, _, entries in snapshots:
+        for article in recent_articles(entries, extract_domain(url), today=day):
+            by_link.setdefault(canonical_link(article.link) or article.link, article)
+    # Newest first, like the live feeds, so deduplication keeps the same story
+    return sorted(by_link.values(), key=lambda article: (article.date, article.link), reverse=True)
+
+def rank_replay_day(day, candidates, profiles):
+    """Deduplicate one day's candidates and rank all of them per profile
+    
+    Runs in a worker process: it only touches its arguments and the module's
+    configuration, and Article records pickle both ways.
+    """
+    unique = remove_duplicates(candidates)
+    return {profile['id']: select_digest_articles(unique, profile, today=day, limit=len(unique))
+            for profile in profiles}
+
+def rank_replay_days(day_candidates, profiles, workers=None):
+    """{day: {profile id: ranked articles}}, one worker process per day where available
+    
+    Serverless runtimes without shared memory for process pools (AWS Lambda,
+    under Vercel) fall back to ranking the days one after another.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    
+    days = list(day_candidates)
+    workers = min(workers or REPLAY_WORKERS or os.cpu_count() or 1, len(days))
+    current_span().set(days=len(days), workers=workers)
+    if workers > 1:
+        try:
+            # Spawned workers import the module fresh instead of forking a process that runs threads
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                return dict(zip(days, pool.map(rank_replay_day, days, day_candidates.values(),
+                                               [profiles] * len(days))))
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            print(f"Process pool unavailable ({e}); ranking {len(days)} days in this process")
+            current_span().set(workers=1)
+    return {day: rank_replay_day(day, candidates, profiles) for day, candidates in day_candidates.items()}
+
+def sent_before_replay(start, end):
+    """({canonical link: sent date}, {title hash: sent date}) for articles sent in the window before each day"""
+    try:
+        conn = open_state_db()
+        try:
+            rows = conn.execute(
+                "SELECT canonical_link, title_hash, sent_date FROM articles WHERE sent_date >= ? AND sent_date < ?",
+                ((start - timedelta(days=FEED_MAX_AGE_DAYS)).isoformat(), end.isoformat())
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Article store read failed: {e}")
+        return {}, {}
+    
+    sent_links, sent_hashes = {}, {}
+    for link, hashed, sent_date in rows:
+        sent_links[link] = min(sent_links.get(link, sent_date), sent_date)
+        sent_hashes[hashed] = min(sent_hashes.get(hashed, sent_date), sent_date)
+    return sent_links, sent_hashes
+
+@traced('replay.run', root=True)
+def replay_digests(start, end, send=False, resend=False, workers=None, budget=None, on_step=None):
+    """Rebuild the digests of every day from `start` to `end` from stored feed snapshots
+    
+    Each day's candidates are the snapshot entries dated within its window
+    (FEED_MAX_AGE_DAYS back from that day). Deduplication and ranking, with
+    recency relative to the replayed day, run for all days in parallel worker
+    processes. Days are then walked in order so a story goes out only once:
+    articles sent before a day, or picked for an earlier replayed day, are
+    skipped. The union of all picks is summarized in one pass, so the summary
+    cache and the Gemini rate limit are shared across days.
+    
+    Without `send` nothing is written: each day's picks come back in the result.
+    With `send` each digest is emailed, unless that profile was already delivered
+    for the day (`resend` overrides), and what was sent is archived and recorded
+    as the live run does. As there, profiles without recipients are dropped
+    before selection.
+    
+    With a RunBudget, summarization stops at its summarize deadline, each send gets
+    its send timeout, and sending stops between days once the budget is spent; the
+    days not reached are marked 'out_of_time' and the outcome is 'out_of_time', so
+    running the same replay again sends only what is missing. The result mirrors
+    run_daily_pipeline's, with per-day 'days' entries instead of 'digests'.
+    """
+    import time
+    
+    def report(step, state, duration=None):
+        if on_step is not None:
+            on_step(step, state, duration)
+    
+    start_time = time.time()
+    step_times = {}
+    run_span = current_span()
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    run_span.set(date_from=start.isoformat(), date_to=end.isoformat(), days=len(days), send=send)
+    print(f"⏪ Replaying {len(days)} day(s) of digests, {start.isoformat()} to {end.isoformat()}"
+          f"{' and sending them' if send else ''}")
+    
+    # Profiles nobody receives are dropped before selection, as in the live run; with
+    # `send`, so are those already delivered for a day (their stories are in the store)
+    skipped = {profile['id']: 'no_recipients' for profile in DIGEST_PROFILES
+               if len(DIGEST_PROFILES) > 1 and not digest_recipients(profile)}
+    profiles = [profile for profile in DIGEST_PROFILES if profile['id'] not in skipped]
+    already_delivered = {day: set() if resend or not send else delivered_digests(day) for day in days}
+    
+    # Step 1: candidates from every snapshot that can hold entries for the range, in one query
+    step_start = time.time()
+    report('rank', 'running')
+    snapshots = load_feed_snapshots(start - timedelta(days=FEED_MAX_AGE_DAYS), end + timedelta(days=FEED_MAX_AGE_DAYS))
+    day_candidates = {day: replay_candidates(snapshots, day) for day in days}
+    with span('replay.rank'):
+        ranked = rank_replay_days(day_candidates, profiles, workers) if profiles else {day: {} for day in days}
+    
+    sent_links, sent_hashes = sent_before_replay(start, end)
+    digests = {}
+    for day in days:
+        day_iso = day.isoformat()
+        digests[day] = {}
+        for profile in profiles:
+            if profile['id'] in already_delivered[day]:
+                continue
+            picked = []
+            for article in ranked[day][profile['id']]:
+                link, hashed = canonical_link(article.link), title_hash(article.title)
+                if sent_links.get(link, day_iso) < day_iso or sent_hashes.get(hashed, day_iso) < day_iso:
+                    continue
+                picked.append(article)
+                if len(picked) >= profile['max_articles']:
+                    break
+            digests[day][profile['id']] = picked
+        # Later days skip what this day picked, as the live run skips what was sent
+        for picked in digests[day].values():
+            for article in picked:
+                link = canonical_link(article.link)
+                if link:
+                    sent_links.setdefault(link, day_iso)
+                sent_hashes.setdefault(title_hash(article.title), day_iso)
+    step_times['ranking'] = time.time() - step_start
+    print(f"✅ Ranked {sum(map(len, day_candidates.values()))} candidates from {len(snapshots)} snapshots "
+          f"in {step_times['ranking']:.1f}s")
+    report('rank', 'done', step_times['ranking'])
+    
+    # Step 2: one summary pass over every picked story; each day has its own copies
+    # of the records, so the summary is copied to the other days' copies
+    step_start = time.time()
+    report('summarize', 'running')
+    copies = {}
+    for day_digests in digests.values():
+        for picked in day_digests.values():
+            for article in picked:
+                copies.setdefault(canonical_link(article.link) or article.link, {})[id(article)] = article
+    unique = [next(iter(group.values())) for group in copies.values()]
+    summary_stats = {}
+    if unique:
+        summarize_with_gemini(unique, limit=len(unique), deadline=budget.summarize_deadline() if budget else None,
+                              summary_stats=summary_stats)
+    for group in copies.values():
+        summarized = next(iter(group.values()))
+        for article in group.values():
+            if 'ai_summary' in summarized:
+                article.ai_summary = summarized.ai_summary
+    step_times['ai_processing'] = time.time() - step_start
+    print(f"✅ AI: {len(unique)} summaries in {step_times['ai_processing']:.1f}s "
+          f"({summary_stats.get('cache', {}).get('hits', 0)} from the cache)")
+    report('summarize', 'done', step_times['ai_processing'])
+    
+    # Step 3: send each rebuilt digest if asked; only what went out is archived and recorded
+    step_start = time.time()
+    report('deliver', 'running')
+    results = []
+    failures = []
+    days_sent = 0
+    for day in days:
+        day_digests = digests[day]
+        day_articles = list({id(article): article for picked in day_digests.values() for article in picked}.values())
+        # Stop between days, never inside one, once another send could overrun the budget
+        out_of_time = send and budget is not None and not budget.can_send()
+        deliveries = {}
+        sent_articles = {}
+        for profile in DIGEST_PROFILES:
+            picked = day_digests.get(profile['id'])
+            if profile['id'] in skipped:
+                deliveries[profile['id']] = skipped[profile['id']]
+            elif picked is None:
+                deliveries[profile['id']] = 'already_sent'
+            elif not picked:
+                deliveries[profile['id']] = 'empty'
+            elif not send:
+                deliveries[profile['id']] = 'rebuilt'
+            elif out_of_time:
+                deliveries[profile['id']] = 'out_of_time'
+            else:
+                try:
+                    rendered = render_digest(picked, profile, now=datetime.combine(day, datetime.min.time()))
+                    picked = picked[:rendered['articles']]
+                    send_daily_email(picked, timeout=budget.send_timeout() if budget else None, profile=profile,
+                                     rendered=rendered)
+                    deliveries[profile['id']] = 'sent'
+                    record_digest_delivery(profile['id'], len(picked), day)
+                    for article in picked:
+                        sent_articles.setdefault(article['link'], article)
+                except Exception as e:
+                    deliveries[profile['id']] = 'failed'
+                    failures.append(f"{day.isoformat()} {profile['id']}: {e}")
+                    print(f"❌ Digest '{profile['id']}' for {day.isoformat()} failed: {e}")
+        if sent_articles:
+            record_sent_articles(list(sent_articles.values()), day)
+            archive_digest(list(sent_articles.values()), day)
+        result = {'date': day.isoformat(), 'candidates': len(day_candidates[day]),
+                  'articles': len(day_articles), 'digests': deliveries}
+        if not send:
+            result['picks'] = {profile_id: [{'title': article['title'], 'link': article['link'],
+                                             'source': article.get('source', 'Unknown Source'),
+                                             'summary': article.get('ai_summary') or article.get('summary', '')}
+                                            for article in picked]
+                               for profile_id, picked in day_digests.items()}
+        results.append(result)
+        days_sent += 0 if out_of_time else 1
+        print(f"📅 {day.isoformat()}: {len(day_articles)} articles from {len(day_candidates[day])} candidates "
+              f"({', '.join(f'{profile_id} {status}' for profile_id, status in deliveries.items())})")
+    step_times['email_send'] = time.time() - step_start
+    report('deliver', 'failed' if failures or days_sent < len(days) else 'done', step_times['email_send'])
+    
+    total_time = time.time() - start_time
+    articles = sum(result['articles'] for result in results)
+    if failures:
+        outcome, message = 'email_failed', f"Replay failed for {'; '.join(failures)}"
+    elif days_sent < len(days):
+        outcome, message = 'out_of_time', (f"Replay ran out of time after {days_sent} of {len(days)} day(s) "
+                                           f"in {total_time:.1f}s; run it again to send the rest.")
+    else:
+        outcome, message = 'replayed', (f"Replayed {len(days)} day(s) ({articles} articles, {len(unique)} summarized) "
+                                        f"in {total_time:.1f}s.")
+    print(f"{'✅' if outcome == 'replayed' else '❌'} {message}")
+    run_span.set(outcome=outcome, articles=articles)
+    return {'outcome': outcome, 'message': message, 'articles': articles, 'trace_id': run_span.trace.trace_id,
+            'days': results, 'summarizers': summarizer_run_report(summary_stats), 'step_times': step_times,
+            'total_time': total_time}
+
+# --- Background Jobs ---
+# A 'running' job older than this died with its instance (Vercel maxDuration is 300s)
+JOB_STALE_AFTER = 600
+
+def daily_idempotency_key(date=None):
+    """One digest per UTC calendar date"""
+    return f"digest-{(date or datetime.utcnow().date()).isoformat()}"
+
+def job_from_row(row):
+    job_id, idempotency_key, status, created_at, updated_at, steps, result, error = row
+    return {
+        'job_id': job_id,
+        'idempotency_key': idempotency_key,
+        'status': status,
+        'created_at': datetime.utcfromtimestamp(created_at).isoformat(),
+        'updated_at': datetime.utcfromtimestamp(updated_at).isoformat(),
+        'steps': json.loads(steps),
+        'result': json.loads(result) if result else None,
+        'error': error
+    }
+
+JOB_COLUMNS = "job_id, idempotency_key, status, created_at, updated_at, steps, result, error"
+
+def claim_job(idempotency_key, force=False):
+    """Create a job for the key unless one already succeeded or is still running
+    
+    Returns (job, created). Failed or stale jobs are replaced so the day can be
+    retried; `force` replaces any existing job (manual re-runs).
+    """
+    import time
+    import uuid
+    
+    now = time.time()
+    conn = open_state_db()
+    try:
+        # BEGIN IMMEDIATE takes the write lock, so concurrent triggers can't both claim
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE idempotency_key = ?",
+                               (idempotency_key,)).fetchone()
+            if row and not force:
+                status, updated_at = row[2], row[4]
+                stale = status in ('queued', 'running') and now - updated_at > JOB_STALE_AFTER
+                if status != 'failed' and not stale:
+                    conn.execute("COMMIT")
+                    return job_from_row(row), False
+            
+            conn.execute("DELETE FROM jobs WHERE idempotency_key = ?", (idempotency_key,))
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                f"INSERT INTO jobs ({JOB_COLUMNS}) VALUES (?, ?, 'queued', ?, ?, '{{}}', NULL, NULL)",
+                (job_id, idempotency_key, now, now)
+            )
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            conn.execute("COMMIT")
+            return job_from_row(row), True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def update_job(job_id, status=None, step=None, result=None, error=None):
+    """Record job status, per-step progress (step=(name, state, duration)) or outcome"""
+    import time
+    
+    now = time.time()
+    conn = open_state_db()
+    try:
+        with conn:
+            row = conn.execute("SELECT steps FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if not row:
+                return
+            steps = json.loads(row[0])
+            if step is not None:
+                name, state, duration = step
+                entry = steps.setdefault(name, {'started_at': datetime.utcnow().isoformat()})
+                entry['status'] = state
+                if duration is not None:
+                    entry['duration_s'] = round(duration, 2)
+            
+            conn.execute(
+                "UPDATE jobs SET status = COALESCE(?, status), steps = ?, updated_at = ?, "
+                "result = COALESCE(?, result), error = COALESCE(?, error) WHERE job_id = ?",
+                (status, json.dumps(steps), now, json.dumps(result) if result is not None else None, error, job_id)
+            )
+    finally:
+        conn.close()
+
+def get_job(job_id=None, idempotency_key=None):
+    """Look a job up by id, or by idempotency key"""
+    conn = open_state_db()
+    try:
+        if job_id:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        else:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE idempotency_key = ?",
+                               (idempotency_key,)).fetchone()
+    finally:
+        conn.close()
+    return job_from_row(row) if row else None
 
-    api_instance.send_transac_email(send_smtp_email)
-    return True
+def run_job(job_id, resend=False, pipeline=None, **options):
+    """Run the daily pipeline (or `pipeline`, e.g. replay_digests) for a claimed job, recording progress"""
+    update_job(job_id, status='running')
+    try:
+        result = (pipeline or run_daily_pipeline)(on_step=lambda name, state, duration: update_job(
+            job_id, step=(name, state, duration)), resend=resend, **options)
+        # Only a run that delivered (or rebuilt) digests settles its key; 'no_articles' and
+        # 'email_failed' stay retryable, so a later trigger the same day runs again
+        status = 'succeeded' if result['outcome'] in ('sent', 'replayed') else 'failed'
+        update_job(job_id, status=status, result=result,
+                   error=result['message'] if status == 'failed' else None)
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}")
+        update_job(job_id, status='failed', error=str(e))
 
 # --- Vercel Handler Function ---
 class handler(BaseHTTPRequestHandler):
+    def send_text(self, status, message, content_type='text/plain'):
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(message.encode())
+    
     def do_GET(self):
         import json
-        import time
-        
-        # Performance monitoring
-        start_time = time.time()
-        step_times = {}
+        from urllib.parse import urlparse, parse_qs
         
         try:
+            path = getattr(self, 'path', '') or ''
+            query = {key: values[-1] for key, values in parse_qs(urlparse(path).query).items()}
+            # vercel.json rewrites /api/index/<route> to /api/index?route=<route>; the
+            # path form still works wherever requests reach the handler unrewritten
+            route = query.get('route') or urlparse(path).path.rstrip('/').rsplit('/', 1)[-1]
+            
             # Check if this is a test endpoint
-            if hasattr(self, 'path') and '/test' in self.path:
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                
+            if route == 'test':
                 env_check = {
                     'timestamp': datetime.utcnow().isoformat(),
                     'gemini_key_set': bool(os.getenv("GEMINI_API_KEY")),
                     'brevo_key_set': bool(os.getenv("BREVO_API_KEY")),
                     'sender_email_set': bool(os.getenv("SENDER_EMAIL")),
                     'recipient_emails_set': bool(os.getenv("RECIPIENT_EMAILS")),
-                    'status': 'Environment configured'
+                    'digests': {profile['id']: len(digest_recipients(profile)) for profile in DIGEST_PROFILES},
+                    'status': 'Environment configured',
+                    'feed_health': feed_health_report(),
+                    'summarizers': summarizer_health_report()
                 }
                 
-                self.wfile.write(json.dumps(env_check).encode())
+                self.send_text(200, json.dumps(env_check), 'application/json')
                 return
             
-            print(f"🚀 Starting optimized AI News automation at {datetime.utcnow().isoformat()}")
-            print(f"🎯 Target execution time: <200 seconds")
+            # Job status polling: ?job=<id>, or ?key=<idempotency key> (defaults to today's digest)
+            if route == 'status':
+                job = get_job(job_id=query.get('job'), idempotency_key=query.get('key') or daily_idempotency_key())
+                if job:
+                    self.send_text(200, json.dumps(job), 'application/json')
+                else:
+                    self.send_text(404, json.dumps({'error': 'Job not found'}), 'application/json')
+                return
             
-            # Step 1: RSS Feed Processing
-            step_start = time.time()
-            try:
-                print(f"📰 [STEP 1/3] Fetching RSS feeds...")
-                articles = fetch_news_articles()
-                step_times['rss_fetch'] = time.time() - step_start
-                print(f"✅ RSS: {len(articles) if articles else 0} articles in {step_times['rss_fetch']:.1f}s")
-            except Exception as e:
-                step_times['rss_fetch'] = time.time() - step_start
-                print(f"❌ RSS fetch failed in {step_times['rss_fetch']:.1f}s: {e}")
-                self.send_response(500)
-                self.send_header('Content-type', 'text/plain')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(f"RSS fetch failed: {str(e)}".encode())
+            # Span histograms of the latest run (or ?trace=<id>): JSON, or ?format=prometheus
+            if route == 'metrics':
+                metrics = load_run_metrics(query.get('trace'))
+                if not metrics:
+                    self.send_text(404, json.dumps({'error': 'No traced run yet'}), 'application/json')
+                elif query.get('format') == 'prometheus':
+                    self.send_text(200, prometheus_metrics(metrics), 'text/plain; version=0.0.4')
+                else:
+                    self.send_text(200, json.dumps(metrics), 'application/json')
                 return
+            
+            # Backfill: ?from=YYYY-MM-DD&to=YYYY-MM-DD rebuilds those days' digests as a preview,
+            # &send=1 emails and archives them; a sending replay is one job per range, with
+            # ?async=1, ?force=1 and ?resend=1 as below. Previews write nothing, so each
+            # request gets its own job and rebuilds from the current state
+            if route == 'replay':
+                import uuid
                 
-            if not articles:
-                total_time = time.time() - start_time
-                print(f"❌ No articles found in {total_time:.1f}s")
-                self.send_response(200)
-                self.send_header('Content-type', 'text/plain')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(b"No articles found today.")
+                try:
+                    start, end = parse_replay_range(query.get('from', ''), query.get('to'))
+                except ValueError as e:
+                    self.send_text(400, json.dumps({'error': str(e)}), 'application/json')
+                    return
+                send, resend = query.get('send') == '1', query.get('resend') == '1'
+                if send:
+                    job, created = claim_job(f"replay-{start.isoformat()}-{end.isoformat()}-send",
+                                             force=resend or query.get('force') == '1')
+                else:
+                    job, created = claim_job(f"replay-preview-{uuid.uuid4().hex}")
+                options = {'pipeline': replay_digests, 'start': start, 'end': end, 'send': send,
+                           'budget': RunBudget()}
+                if created and query.get('async') == '1':
+                    threading.Thread(target=run_job, args=(job['job_id'], resend), kwargs=options,
+                                     name=f"job-{job['job_id']}").start()
+                elif created:
+                    run_job(job['job_id'], resend, **options)
+                    job = get_job(job_id=job['job_id'])
+                self.send_text(202 if job['status'] in ('queued', 'running') else
+                               500 if job['status'] == 'failed' else 200, json.dumps(job), 'application/json')
                 return
             
-            # Step 2: AI Summarization
-            step_start = time.time()
-            try:
-                print(f"🤖 [STEP 2/3] AI summarization ({len(articles)} articles)...")
-                summarized_articles = summarize_with_gemini(articles)
-                step_times['ai_processing'] = time.time() - step_start
-                print(f"✅ AI: {len(summarized_articles)} summaries in {step_times['ai_processing']:.1f}s")
-                    
-            except Exception as e:
-                step_times['ai_processing'] = time.time() - step_start
-                print(f"⚠️ AI failed in {step_times['ai_processing']:.1f}s, using fallbacks: {e}")
-                summarized_articles = articles[:12]
-                for article in summarized_articles:
-                    article['ai_summary'] = create_quick_fallback_summary(article)
+            # Anything but the bare endpoint is a mistyped route, never a trigger
+            if route not in ('', 'index'):
+                self.send_text(404, json.dumps({'error': f"Unknown route '{route}'"}), 'application/json')
+                return
             
-            # Step 3: Email Delivery
-            step_start = time.time()
-            try:
-                print(f"📧 [STEP 3/3] Sending email ({len(summarized_articles)} articles)...")
-                send_daily_email(summarized_articles)
-                step_times['email_send'] = time.time() - step_start
-                
-                # Performance Summary
-                total_time = time.time() - start_time
-                print(f"✅ Email sent in {step_times['email_send']:.1f}s")
-                print(f"")
-                print(f"📊 PERFORMANCE SUMMARY:")
-                print(f"   RSS Fetch:     {step_times.get('rss_fetch', 0):.1f}s")
-                print(f"   AI Processing: {step_times.get('ai_processing', 0):.1f}s")
-                print(f"   Email Send:    {step_times.get('email_send', 0):.1f}s")
-                print(f"   TOTAL TIME:    {total_time:.1f}s")
-                
-                # Performance analysis
-                if total_time < 120:
-                    print(f"🎯 EXCELLENT: Completed in {total_time:.1f}s (target: <200s)")
-                elif total_time < 200:
-                    print(f"✅ GOOD: Completed in {total_time:.1f}s (within target)")
-                else:
-                    print(f"⚠️ SLOW: Took {total_time:.1f}s (target: <200s)")
-                
-                success_msg = f"Success! Daily AI news sent ({len(summarized_articles)} articles) in {total_time:.1f}s at {datetime.utcnow().isoformat()}."
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'text/plain')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(success_msg.encode())
-                
-            except Exception as e:
-                step_times['email_send'] = time.time() - step_start
-                total_time = time.time() - start_time
-                error_msg = f"Email failed after {total_time:.1f}s: {str(e)}"
-                print(f"❌ {error_msg}")
-                self.send_response(500)
-                self.send_header('Content-type', 'text/plain')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(error_msg.encode())
+            # Retried triggers for the same day reuse the existing job instead of sending again.
+            # Jobs live in this instance's /tmp state file, so the check only sees triggers
+            # served by the same instance (or every instance, with NEWS_STATE_DB on shared storage)
+            idempotency_key = (self.headers.get('Idempotency-Key') if getattr(self, 'headers', None) else None) \
+                or query.get('key') or daily_idempotency_key()
+            # ?force=1 runs the day again, still skipping profiles already sent today;
+            # ?resend=1 also sends those again
+            resend = query.get('resend') == '1'
+            job, created = claim_job(idempotency_key, force=resend or query.get('force') == '1')
+            
+            if query.get('async') == '1':
+                # Job mode: answer 202 right away and run the pipeline in the background.
+                # Single-instance only: Vercel may freeze the instance once it has responded,
+                # and a status poll can land on an instance that never saw the job
+                if created:
+                    threading.Thread(target=run_job, args=(job['job_id'], resend), name=f"job-{job['job_id']}").start()
+                self.send_text(202 if created or job['status'] in ('queued', 'running') else 200,
+                               json.dumps(job), 'application/json')
+                return
+            
+            if not created:
+                self.send_text(200, f"Digest for {idempotency_key} already {job['status']} (job {job['job_id']}); "
+                                    f"not sending again. Add ?force=1 to run it again, or ?resend=1 to re-send.")
+                return
+            
+            run_job(job['job_id'], resend=resend)
+            job = get_job(job_id=job['job_id'])
+            if job['status'] == 'succeeded':
+                self.send_text(200, job['result']['message'])
+            else:
+                self.send_text(500, job['error'] or "Pipeline failed")
             
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
             print(f"Handler error: {error_msg}")
-            self.send_response(500)
-            self.send_header('Content-type', 'text/plain')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(error_msg.encode())
+            self.send_text(500, error_msg)
     
     def do_POST(self):
         self.do_GET()
+
+def main():
+    """Command line: rebuild past digests from the state database (NEWS_STATE_DB)
+    
+        python api/index.py replay 2026-10-10 2026-10-16 [--send] [--resend] [--workers N]
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="AI news digest tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    replay = commands.add_parser('replay', help="rebuild the digests of a date range")
+    replay.add_argument('date_from', help="first day, YYYY-MM-DD")
+    replay.add_argument('date_to', nargs='?', help="last day, YYYY-MM-DD (default: the first day)")
+    replay.add_argument('--send', action='store_true', help="email each rebuilt digest and archive what was sent")
+    replay.add_argument('--resend', action='store_true', help="send even where a day was already delivered")
+    replay.add_argument('--workers', type=int, default=None, help="ranking processes (default: REPLAY_WORKERS or CPUs)")
+    args = parser.parse_args()
+    
+    try:
+        start, end = parse_replay_range(args.date_from, args.date_to)
+    except ValueError as e:
+        parser.error(str(e))
+    result = replay_digests(start, end, send=args.send, resend=args.resend, workers=args.workers)
+    print(json.dumps(result['days'], indent=2))
+    raise SystemExit(0 if result['outcome'] == 'replayed' else 1)
+
+if __name__ == '__main__':
+    main()
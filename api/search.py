@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import time
+import sqlite3
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from datetime import datetime
+
+# Same file api/index.py archives each delivered digest into. Required: this is a
+# separate function, and another function's /tmp is never visible from here
+DIGEST_ARCHIVE_DB_PATH = os.getenv("DIGEST_ARCHIVE_DB", "")
+
+MAX_PER_PAGE = 50
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, last word as a prefix"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    return ' '.join(terms)
+
+def search_archive(conn, query=None, date_from=None, date_to=None, source=None, page=1, per_page=20):
+    """Ranked keyword search over archived digests with date/source filters and source facets
+    
+    Keyword searches are driven by the FTS5 index (bm25 ranking); filter-only
+    browsing seeks the digest_date index to the date range, newest first. Only
+    browsing with no date range at all reads a whole index, to count the facets.
+    """
+    filters = []
+    params = []
+    if date_from:
+        filters.append("a.digest_date >= ?")
+        params.append(date_from)
+    if date_to:
+        filters.append("a.digest_date <= ?")
+        params.append(date_to)
+    
+    match = fts_query(query) if query else None
+    if match:
+        base = ("FROM digest_archive_fts JOIN digest_archive a ON a.id = digest_archive_fts.rowid "
+                "WHERE digest_archive_fts MATCH ?")
+        facet_base = base
+        base_params = [match]
+        rank = "bm25(digest_archive_fts, 10.0, 1.0)"  # Title hits weigh more than summary hits
+        order = f"{rank}, a.digest_date DESC"
+    else:
+        base = "FROM digest_archive a WHERE 1 = 1"
+        # Grouping by source tempts the planner into walking all of (source, digest_date)
+        # to skip a sort; the date range is far more selective, so seek on it instead
+        facet_base = ("FROM digest_archive a INDEXED BY idx_digest_archive_date WHERE 1 = 1" if filters
+                      else base)
+        base_params = []
+        rank = "NULL"
+        order = "a.digest_date DESC, a.id"
+    
+    where = ''.join(f" AND {condition}" for condition in filters)
+    
+    # Facets ignore the source filter so every source stays selectable
+    facets = dict(conn.execute(
+        f"SELECT a.source, COUNT(*) {facet_base}{where} GROUP BY a.source ORDER BY COUNT(*) DESC",
+        base_params + params
+    ).fetchall())
+    
+    if source:
+        where += " AND a.source = ?"
+        params.append(source)
+    
+    total = facets.get(source, 0) if source else sum(facets.values())
+    rows = conn.execute(
+        f"SELECT a.digest_date, a.title, a.link, a.source, a.published, a.summary, {rank} "
+        f"{base}{where} ORDER BY {order} LIMIT ? OFFSET ?",
+        base_params + params + [per_page, (page - 1) * per_page]
+    ).fetchall()
+    
+    results = [{
+        'digest_date': digest_date,
+        'title': title,
+        'link': link,
+        'source': row_source,
+        'published': published,
+        'summary': summary,
+        'score': round(-score, 4) if score is not None else None
+    } for digest_date, title, link, row_source, published, summary, score in rows]
+    
+    return {'total': total, 'results': results, 'facets': {'source': facets}}
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        """
+        Searches the digest archive.
+        
+        Query parameters: q (keywords), from / to (YYYY-MM-DD digest dates),
+        source, page (1-based) and per_page (max 50).
+        """
+        start_time = time.time()
+        query = {key: values[-1] for key, values in parse_qs(urlparse(self.path).query).items()}
+        
+        try:
+            page = max(1, int(query.get('page', 1)))
+            per_page = min(MAX_PER_PAGE, max(1, int(query.get('per_page', 20))))
+            for key in ('from', 'to'):
+                if query.get(key):
+                    datetime.strptime(query[key], "%Y-%m-%d")
+        except ValueError:
+            self.send_json(400, {
+                "status": "error",
+                "message": "page/per_page must be integers and from/to dates must be YYYY-MM-DD."
+            })
+            return
+        
+        if not DIGEST_ARCHIVE_DB_PATH:
+            self.send_json(503, {
+                "status": "error",
+                "message": "Search is not configured: set DIGEST_ARCHIVE_DB to an archive path that both "
+                           "api/index.py and api/search.py can reach (not /tmp, which each function has "
+                           "to itself)."
+            })
+            return
+        
+        if not os.path.exists(DIGEST_ARCHIVE_DB_PATH):
+            self.send_json(200, {"status": "success", "total": 0, "results": [], "facets": {"source": {}},
+                                 "message": "No digests have been archived yet."})
+            return
+        
+        try:
+            conn = sqlite3.connect(f"file:{DIGEST_ARCHIVE_DB_PATH}?mode=ro", uri=True, timeout=5)
+            try:
+                found = search_archive(conn, query.get('q'), query.get('from'), query.get('to'),
+                                       query.get('source'), page, per_page)
+            finally:
+                conn.close()
+        except sqlite3.OperationalError as e:
+            # The archive tables are created with the first delivered digest
+            if 'no such table' in str(e):
+                found = {'total': 0, 'results': [], 'facets': {'source': {}}}
+            else:
+                self.send_json(500, {"status": "error", "message": f"Search failed: {e}"})
+                return
+        
+        self.send_json(200, {
+            "status": "success",
+            "query": query.get('q'),
+            "from": query.get('from'),
+            "to": query.get('to'),
+            "source": query.get('source'),
+            "page": page,
+            "per_page": per_page,
+            **found,
+            "took_ms": round((time.time() - start_time) * 1000, 2),
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    def send_json(self, status, data):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data, indent=2).encode('utf-8'))
+
+    def do_POST(self):
+        """
+        Handles POST requests by calling the GET handler.
+        """
+        self.do_GET()
@@ -0,0 +1,149 @@
+"""Local stand-in for Brevo's transactional email endpoint, plus an offline throughput test
+
+    python bench/mock_brevo.py --recipients 10000 --bad 25 --latency 0.05 --error-rate 0.05
+
+Starts the mock on a free port, points the delivery layer in api/index.py at it
+(BREVO_API_URL) and sends one digest to N generated recipients. The mock accepts
+POST /v3/smtp/email with `messageVersions`, answers 201 with one message id per
+version, rejects a whole request with 400 when any address is on the
+`invalid.test` domain (like Brevo does for a malformed recipient), and can
+inject latency and 429/503 responses.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class MockBrevoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so client connection pooling is exercised
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if self.path.rstrip('/') != '/v3/smtp/email':
+            return self.send_json(404, {'code': 'not_found', 'message': f"Unknown path {self.path}"})
+        if not self.headers.get('api-key'):
+            return self.send_json(401, {'code': 'unauthorized', 'message': "Key not found"})
+
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.stats['requests'] += 1
+            injected = server.random.random() < server.error_rate
+        if injected:
+            status = random.choice((429, 503))
+            with server.lock:
+                server.stats[f'injected_{status}'] += 1
+            return self.send_json(status, {'code': 'too_many_requests' if status == 429 else 'unavailable',
+                                           'message': "Injected failure"})
+
+        try:
+            message = json.loads(body)
+        except ValueError:
+            return self.send_json(400, {'code': 'bad_request', 'message': "Invalid JSON"})
+
+        versions = message.get('messageVersions') or [{'to': message.get('to') or []}]
+        if len(versions) > 1000:
+            return self.send_json(400, {'code': 'invalid_parameter', 'message': "Too many messageVersions"})
+        recipients = [recipient.get('email', '') for version in versions for recipient in version.get('to', [])]
+        bad = [email for email in recipients if email.endswith('@invalid.test')]
+        if bad or not recipients:
+            with server.lock:
+                server.stats['rejected'] += 1
+            return self.send_json(400, {'code': 'invalid_parameter',
+                                        'message': f"email is not valid in to: {bad[0] if bad else '(none)'}"})
+
+        message_ids = [f"<{uuid.uuid4().hex}@mock.brevo>" for _ in versions]
+        with server.lock:
+            server.stats['accepted_versions'] += len(versions)
+            server.stats['delivered'].update(recipients)
+        self.send_json(201, {'messageIds': message_ids} if message.get('messageVersions')
+                       else {'messageId': message_ids[0]})
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_brevo(port=0, latency=0.0, error_rate=0.0, seed=0):
+    """Serve the mock on a background thread; returns the server (see `server.url`)"""
+    from collections import Counter
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockBrevoHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.random = random.Random(seed)
+    server.lock = threading.Lock()
+    server.stats = Counter(delivered=set())
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/v3"
+    threading.Thread(target=server.serve_forever, name='mock-brevo', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', type=int, default=10000)
+    parser.add_argument('--bad', type=int, default=25, help="recipients on the rejected invalid.test domain")
+    parser.add_argument('--malformed', type=int, default=5, help="addresses caught before sending")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per mock API call")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="share of calls answered 429/503")
+    parser.add_argument('--batch-size', type=int, default=None, help="BREVO_BATCH_SIZE")
+    parser.add_argument('--concurrency', type=int, default=None, help="BREVO_SEND_CONCURRENCY")
+    args = parser.parse_args()
+
+    server = start_mock_brevo(latency=args.latency, error_rate=args.error_rate)
+    os.environ['BREVO_API_URL'] = server.url
+    if args.batch_size:
+        os.environ['BREVO_BATCH_SIZE'] = str(args.batch_size)
+    if args.concurrency:
+        os.environ['BREVO_SEND_CONCURRENCY'] = str(args.concurrency)
+
+    sys.path.insert(0, ROOT)
+    from api import index
+
+    rng = random.Random(1)
+    recipients = [f"reader{i}@example.com" for i in range(args.recipients)]
+    for i in rng.sample(range(args.recipients), min(args.bad, args.recipients)):
+        recipients[i] = f"reader{i}@invalid.test"
+    for i in rng.sample(range(args.recipients), min(args.malformed, args.recipients)):
+        recipients[i] = f"reader{i} at example.com"
+
+    articles = [{'title': f"Benchmark story {i}", 'link': f"https://example.com/{i}", 'source': "Bench",
+                 'date': None, 'ai_summary': "A summary sentence. " * 8} for i in range(12)]
+    html_content = index.create_daily_email(articles)
+
+    start = time.time()
+    statuses = index.send_bulk_email(recipients, "Benchmark digest", html_content, {'email': "bench@example.com"},
+                                     "mock-key")
+    elapsed = time.time() - start
+
+    counts = {}
+    for status in statuses.values():
+        counts[status['status']] = counts.get(status['status'], 0) + 1
+    stats = server.stats
+    print(f"Recipients:  {len(recipients)} in {elapsed:.2f}s ({len(recipients) / max(elapsed, 1e-9):,.0f}/s)")
+    print(f"Statuses:    {counts}")
+    print(f"Mock calls:  {stats['requests']} ({stats['rejected']} rejected as a whole, "
+          f"{stats['injected_429']} x 429, {stats['injected_503']} x 503 injected)")
+    print(f"Batching:    batch size {index.BREVO_BATCH_SIZE}, concurrency {index.BREVO_SEND_CONCURRENCY}")
+
+    sent = {email for email, status in statuses.items() if status['status'] == 'sent'}
+    assert sent == stats['delivered'], "per-recipient status disagrees with what the mock accepted"
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
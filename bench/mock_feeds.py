@@ -0,0 +1,168 @@
+"""Local RSS server with canned feeds of configurable count, size and latency
+
+    python bench/mock_feeds.py --items 20 --latency 0.1 --port 8765
+
+Serves GET /feed/<n>.xml for any n. Each feed is deterministic for its number
+and the UTC date, and items are dated within the last day, so they pass the
+digest's recency window. Item links point at /article/<n>/<i>.html on the same
+server: an HTML page with navigation, scripts and an <article> body, for the
+full-article extraction stage. Titles draw from a large vocabulary so that
+near-duplicate detection doesn't merge unrelated stories. Responses carry an
+ETag and answer If-None-Match with 304, like most real feeds.
+"""
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+VOCABULARY = [f"{syllable}{suffix}" for syllable in (
+    "model", "chip", "agent", "robot", "vision", "speech", "cloud", "data", "policy", "lab", "startup",
+    "fund", "paper", "token", "kernel", "sensor", "drone", "health", "code", "search", "audio", "graph",
+    "train", "infer", "align", "safety", "bench", "open", "edge", "quant"
+) for suffix in ("", "s", "er", "ing", "ed", "ix", "ora", "ify", "ware", "net")]
+
+def render_feed(number, items, item_bytes, now, base_url=None):
+    """RSS 2.0 document for one feed; `item_bytes` sets each description's length"""
+    rng = random.Random(f"{number}-{now.date().isoformat()}")
+    entries = []
+    for i in range(items):
+        title = " ".join(rng.sample(VOCABULARY, 7)).capitalize()
+        words = []
+        while sum(len(word) + 1 for word in words) < item_bytes:
+            words.append(rng.choice(VOCABULARY))
+        published = now - timedelta(minutes=30 * i + rng.randint(0, 29))
+        entries.append(
+            f"<item><title>{escape(title)}</title>"
+            f"<link>{escape(article_url(base_url, number, i, now))}</link>"
+            f"<description>{escape(' '.join(words)[:item_bytes])}.</description>"
+            f"<pubDate>{format_datetime(published.replace(tzinfo=None), usegmt=False)}</pubDate></item>"
+        )
+    return (f"<?xml version='1.0' encoding='UTF-8'?><rss version='2.0'><channel>"
+            f"<title>Bench feed {number}</title><link>https://feed{number}.example.com/</link>"
+            f"{''.join(entries)}</channel></rss>").encode('utf-8')
+
+def article_url(base_url, number, i, now):
+    if base_url:
+        return f"{base_url}/article/{number}/{i}.html?d={now.date().isoformat()}"
+    return f"https://feed{number}.example.com/{now.date().isoformat()}/{i}"
+
+def render_article(number, i, article_bytes, now):
+    """HTML page for one feed item: page chrome around an <article> of about `article_bytes` of text"""
+    rng = random.Random(f"article-{number}-{i}-{now.date().isoformat()}")
+    paragraphs = []
+    while sum(len(paragraph) for paragraph in paragraphs) < article_bytes:
+        sentences = [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(8, 16))).capitalize() + "."
+                     for _ in range(rng.randint(2, 4))]
+        paragraphs.append(" ".join(sentences))
+    return (f"<!DOCTYPE html><html><head><title>Story {i}</title><script>var tracking = {{id: {number}}};</script>"
+            f"<style>body {{ font-family: sans-serif; }}</style></head><body>"
+            "<header><nav><a href='/'>Home</a> <a href='/news'>News</a> <a href='/about'>About this site</a></nav></header>"
+            f"<main><article><h1>Story {i} from feed {number}</h1><p>By Bench Reporter</p>"
+            + "".join(f"<p>{escape(paragraph)}</p>" for paragraph in paragraphs) +
+            "</article><aside><p>Related stories you might also enjoy reading on this site today</p></aside></main>"
+            "<footer><p>Copyright notice and links to the privacy policy of the bench site</p></footer>"
+            "</body></html>").encode('utf-8')
+
+class MockFeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        name = self.path.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+        article = re.match(r'^/article/(\d+)/(\d+)\.html', self.path)
+        if article:
+            if server.latency or server.jitter:
+                time.sleep(server.latency + random.uniform(0, server.jitter))
+            body = render_article(int(article.group(1)), int(article.group(2)), server.article_bytes,
+                                  datetime.utcnow())
+            with server.lock:
+                server.stats['articles'] += 1
+            return self.send_body(200, body, 'text/html; charset=utf-8')
+        if not (self.path.startswith('/feed/') and name.endswith('.xml') and name[:-4].isdigit()):
+            return self.send_body(404, b"Not found", 'text/plain')
+
+        number = int(name[:-4])
+        now = datetime.utcnow().replace(second=0, microsecond=0)
+        cache_key = (number, now.date())
+        with server.lock:
+            server.stats['requests'] += 1
+            body = server.bodies.get(cache_key)
+        if body is None:
+            body = render_feed(number, server.items, server.item_bytes, now, server.url)
+            with server.lock:
+                server.bodies[cache_key] = body
+
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        if self.headers.get('If-None-Match') == etag:
+            with server.lock:
+                server.stats['not_modified'] += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with server.lock:
+            server.stats['bytes'] += len(body)
+        self.send_body(200, body, 'application/rss+xml', etag)
+
+    def send_body(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_feeds(port=0, items=10, item_bytes=300, latency=0.0, jitter=0.0, article_bytes=4000):
+    """Serve feeds on a background thread; `server.feed_urls(n)` lists n feed URLs"""
+    from collections import Counter
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockFeedHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.items = items
+    server.item_bytes = item_bytes
+    server.article_bytes = article_bytes
+    server.latency = latency
+    server.jitter = jitter
+    server.lock = threading.Lock()
+    server.bodies = {}
+    server.stats = Counter()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.feed_urls = lambda count: [f"{server.url}/feed/{number}.xml" for number in range(count)]
+    threading.Thread(target=server.serve_forever, name='mock-feeds', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--items', type=int, default=10, help="items per feed")
+    parser.add_argument('--item-bytes', type=int, default=300, help="description length per item")
+    parser.add_argument('--article-bytes', type=int, default=4000, help="text length of each linked article page")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds before each response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random latency, up to this many seconds")
+    args = parser.parse_args()
+
+    server = start_mock_feeds(args.port, args.items, args.item_bytes, args.latency, args.jitter, args.article_bytes)
+    print(f"Serving feeds at {server.url}/feed/<n>.xml (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Local stand-in for the Gemini REST generateContent endpoint
+
+    python bench/mock_gemini.py --latency 0.4 --error-rate 0.05 --port 8766
+
+Point the app at it with GEMINI_API_URL=http://127.0.0.1:8766 (the client then
+uses the REST transport). Single-article prompts get a canned summary built
+from the title. Batch prompts (JSON response mode) get a JSON array with one
+summary per bracketed article. A share of calls can be answered with 429
+RESOURCE_EXHAUSTED to exercise retry and backoff.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def canned_summary(title):
+    return (f"{title.strip()} is the focus of this report. The article describes who is involved and what "
+            f"changed. It closes with what the development could mean for the wider AI field.")
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if not re.search(r'/models/[^/:]+:generateContent', self.path):
+            return self.send_json(404, {'error': {'code': 404, 'message': f"Unknown path {self.path}",
+                                                  'status': 'NOT_FOUND'}})
+
+        latency = server.latency + random.uniform(0, server.jitter)
+        if latency:
+            time.sleep(latency)
+        with server.lock:
+            server.stats['requests'] += 1
+            throttled = server.random.random() < server.error_rate
+            if throttled:
+                server.stats['throttled'] += 1
+        if throttled:
+            return self.send_json(429, {'error': {'code': 429, 'message': "Resource has been exhausted (injected)",
+                                                  'status': 'RESOURCE_EXHAUSTED'}})
+
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return self.send_json(400, {'error': {'code': 400, 'message': "Invalid JSON",
+                                                  'status': 'INVALID_ARGUMENT'}})
+        prompt = "\n".join(part.get('text', '') for content in request.get('contents', [])
+                           for part in content.get('parts', []))
+        generation_config = request.get('generationConfig') or request.get('generation_config') or {}
+
+        if (generation_config.get('responseMimeType') or generation_config.get('response_mime_type')) == 'application/json':
+            batch = re.findall(r'^\[(\d+)\] Title: (.*)$', prompt, flags=re.M)
+            text = json.dumps([{'index': int(index), 'summary': canned_summary(title)} for index, title in batch])
+        else:
+            title = re.search(r'^Title: (.*)$', prompt, flags=re.M)
+            text = canned_summary(title.group(1) if title else "This story")
+
+        with server.lock:
+            server.stats['prompt_chars'] += len(prompt)
+        self.send_json(200, {
+            'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'},
+                            'finishReason': 'STOP', 'index': 0}],
+            'usageMetadata': {'promptTokenCount': len(prompt) // 4, 'candidatesTokenCount': len(text) // 4,
+                              'totalTokenCount': (len(prompt) + len(text)) // 4}
+        })
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_gemini(port=0, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+    """Serve the mock on a background thread; returns the server (see `server.url`)"""
+    from collections import Counter
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockGeminiHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.random = random.Random(seed)
+    server.lock = threading.Lock()
+    server.stats = Counter()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name='mock-gemini', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.4, help="seconds per call")
+    parser.add_argument('--jitter', type=float, default=0.2, help="extra random latency, up to this many seconds")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="share of calls answered 429")
+    args = parser.parse_args()
+
+    server = start_mock_gemini(args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Serving Gemini at {server.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""Offline benchmark of the real fetch → summarize → render → send path
+
+    python bench/run_bench.py --feeds 6,50,200 --items 10 --repeats 5 --output bench/results.json
+    python bench/run_bench.py --compare bench/results.json   # re-run and diff against a saved file
+
+Local stand-ins serve the feeds (bench/mock_feeds.py), Gemini (bench/mock_gemini.py)
+and Brevo (bench/mock_brevo.py). The app in api/index.py runs unchanged and is
+pointed at them through GEMINI_API_URL and BREVO_API_URL. Each repeat starts
+from an empty state database, so caches are cold unless --warm is given. Every
+scenario (feed count x items per feed) reports p50/p95 per stage plus
+throughput, and the whole run is written as JSON for comparison across commits.
+An import-time profile (`python -X importtime` in a fresh interpreter) records
+what a cold start pays for `api.index` alone and for each SDK on first use.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+STAGES = ('fetch', 'summarize', 'render', 'send', 'total')
+# Imported by api/index.py only when a run needs them
+DEFERRED_MODULES = ('feedparser', 'google.generativeai', 'sib_api_v3_sdk', 'httpx', 'numpy')
+IMPORT_REPEATS = 3
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+def stage_stats(samples, percentile):
+    return {
+        'p50': round(percentile(samples, 0.5), 4),
+        'p95': round(percentile(samples, 0.95), 4),
+        'min': round(min(samples), 4),
+        'max': round(max(samples), 4),
+        'mean': round(sum(samples) / len(samples), 4)
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def import_profile(env):
+    """Cumulative import time (ms) of api.index, then of each deferred module on top of it
+    
+    Every sample is a fresh interpreter, so these are cold-start numbers; the best
+    of IMPORT_REPEATS runs is kept. `loaded_eagerly` lists deferred modules that
+    `import api.index` pulled in anyway (it should be empty).
+    """
+    modules = ('api.index',) + DEFERRED_MODULES
+    code = "; ".join(f"import {module}" for module in modules) + \
+        "; import sys; print(','.join(m for m in %r if m in sys.modules))" % (DEFERRED_MODULES,)
+    # The eager check has to run before the deferred imports, so it gets its own interpreter
+    eager_code = "import sys, api.index; print(','.join(m for m in %r if m in sys.modules))" % (DEFERRED_MODULES,)
+    
+    best = {}
+    for _ in range(IMPORT_REPEATS):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, timeout=120)
+        timings = {}
+        for line in result.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2]
+            # Top-level imports are indented by a single space
+            if len(name) - len(name.lstrip()) == 1:
+                timings[name.strip()] = int(fields[1]) / 1000
+        for module in modules:
+            # Sub-packages like google.generativeai show up under their parent package
+            ms = timings.get(module, timings.get(module.split('.')[0]))
+            if ms is not None:
+                best[module] = round(min(best.get(module, ms), ms), 1)
+    
+    eager = subprocess.run([sys.executable, '-c', eager_code], cwd=ROOT, env=env, capture_output=True,
+                           text=True, timeout=120).stdout.strip()
+    return {'ms': best, 'loaded_eagerly': [module for module in eager.split(',') if module]}
+
+def run_scenario(index, servers, feeds, items, args, state_dir):
+    """Run one scenario `args.repeats` times and return its summary"""
+    feed_server, gemini_server, brevo_server = servers
+    feed_server.items = items
+    feed_server.bodies.clear()
+    index.RSS_FEEDS = feed_server.feed_urls(feeds)
+    profile = {**index.DEFAULT_DIGEST_PROFILE, 'id': 'bench', 'recipients_env': 'BENCH_RECIPIENTS'}
+
+    samples = {stage: [] for stage in STAGES}
+    counts = {'articles': [], 'summaries': [], 'bytes': []}
+    gemini_before = dict(gemini_server.stats)
+    brevo_before = dict(brevo_server.stats)
+    feed_before = dict(feed_server.stats)
+
+    for repeat in range(args.repeats):
+        if not args.warm or repeat == 0:
+            # A fresh state file per repeat keeps feed, summary and article caches cold
+            index.STATE_DB_PATH = index.DIGEST_ARCHIVE_DB_PATH = os.path.join(
+                state_dir, f"state-{feeds}x{items}-{repeat}.db")
+            index.render_article_fragment.cache_clear()
+
+        start = time.perf_counter()
+        articles = index.fetch_news_articles()
+        fetched = time.perf_counter()
+        summary_stats = {}
+        summarized = index.summarize_with_gemini(articles, limit=12, summary_stats=summary_stats)
+        summarized_at = time.perf_counter()
+        rendered = index.render_digest(summarized, profile)
+        rendered_at = time.perf_counter()
+        index.send_daily_email(summarized, profile=profile, rendered=rendered)
+        sent = time.perf_counter()
+
+        samples['fetch'].append(fetched - start)
+        samples['summarize'].append(summarized_at - fetched)
+        samples['render'].append(rendered_at - summarized_at)
+        samples['send'].append(sent - rendered_at)
+        samples['total'].append(sent - start)
+        counts['articles'].append(len(articles))
+        counts['summaries'].append(len(summarized))
+        counts['bytes'].append(rendered['bytes'])
+        summarizers = index.summarizer_run_report(summary_stats)
+
+    stats = {stage: stage_stats(values, index.percentile) for stage, values in samples.items()}
+    fetch_p50 = stats['fetch']['p50']
+    summarize_p50 = stats['summarize']['p50']
+    send_p50 = stats['send']['p50']
+    return {
+        'feeds': feeds,
+        'items_per_feed': items,
+        'repeats': args.repeats,
+        'stages': stats,
+        'throughput': {
+            'feeds_per_s': round(feeds / fetch_p50, 1) if fetch_p50 else None,
+            'entries_per_s': round(feeds * items / fetch_p50, 1) if fetch_p50 else None,
+            'summaries_per_s': round(max(counts['summaries']) / summarize_p50, 2) if summarize_p50 else None,
+            'recipients_per_s': round(args.recipients / send_p50, 1) if send_p50 else None
+        },
+        'articles_selected': max(counts['articles']),
+        'email_bytes': max(counts['bytes']),
+        'gemini': {key: gemini_server.stats[key] - gemini_before.get(key, 0)
+                   for key in ('requests', 'throttled', 'prompt_chars')},
+        'summarizers': summarizers,
+        'pages_fetched': feed_server.stats['articles'] - feed_before.get('articles', 0),
+        'brevo': {key: brevo_server.stats[key] - brevo_before.get(key, 0)
+                  for key in ('requests', 'accepted_versions')}
+    }
+
+def print_table(scenarios):
+    print("")
+    print(f"{'feeds':>6} {'items':>6}  " + "  ".join(f"{stage + ' p50/p95 (s)':>22}" for stage in STAGES))
+    for scenario in scenarios:
+        cells = [f"{scenario['stages'][stage]['p50']:>10.3f} / {scenario['stages'][stage]['p95']:<9.3f}"
+                 for stage in STAGES]
+        print(f"{scenario['feeds']:>6} {scenario['items_per_feed']:>6}  " + "  ".join(f"{cell:>22}" for cell in cells))
+    print("")
+    for scenario in scenarios:
+        throughput = scenario['throughput']
+        print(f"{scenario['feeds']:>4} feeds x {scenario['items_per_feed']:<3} items: "
+              f"{throughput['entries_per_s']} entries/s fetched, {throughput['summaries_per_s']} summaries/s, "
+              f"{throughput['recipients_per_s']} recipients/s; gemini {scenario['gemini']}, "
+              f"{scenario['email_bytes'] / 1024:.1f}KB email")
+
+def print_imports(imports):
+    print("")
+    print("Cold import (ms): " + ", ".join(f"{module} {ms}" for module, ms in imports['ms'].items()))
+    if imports['loaded_eagerly']:
+        print(f"  loaded by `import api.index`: {', '.join(imports['loaded_eagerly'])}")
+
+def print_comparison(previous, scenarios, imports=None):
+    """p50/p95 change per stage against a saved result file (positive = slower)"""
+    baseline = {(scenario['feeds'], scenario['items_per_feed']): scenario for scenario in previous['scenarios']}
+    print("")
+    print(f"Compared with {previous['meta'].get('commit') or 'previous run'} "
+          f"({previous['meta'].get('timestamp', '?')}):")
+    old_ms = (previous.get('imports') or {}).get('ms', {}).get('api.index')
+    if imports and old_ms and imports['ms'].get('api.index') is not None:
+        print(f"  import api.index: {old_ms} -> {imports['ms']['api.index']} ms")
+    for scenario in scenarios:
+        before = baseline.get((scenario['feeds'], scenario['items_per_feed']))
+        if before is None:
+            continue
+        changes = []
+        for stage in STAGES:
+            for key in ('p50', 'p95'):
+                old, new = before['stages'][stage][key], scenario['stages'][stage][key]
+                if old:
+                    changes.append(f"{stage} {key} {(new - old) / old * 100:+.0f}%")
+        print(f"  {scenario['feeds']} feeds x {scenario['items_per_feed']} items: {', '.join(changes)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--feeds', type=int_list, default=[6, 50, 200], help="comma-separated feed counts")
+    parser.add_argument('--items', type=int_list, default=[10], help="comma-separated items per feed")
+    parser.add_argument('--item-bytes', type=int, default=300, help="description length per feed item")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warm', action='store_true', help="keep caches between repeats (steady state)")
+    parser.add_argument('--per-host-limit', type=int, default=None,
+                        help="FEED_PER_HOST_LIMIT; defaults to the largest feed count, since every mock feed "
+                             "shares one host while real feeds mostly don't")
+    parser.add_argument('--article-bytes', type=int, default=4000, help="text per linked article page")
+    parser.add_argument('--no-extraction', action='store_true', help="ARTICLE_EXTRACTION=0 (feed teasers only)")
+    parser.add_argument('--feed-latency', type=float, default=0.05)
+    parser.add_argument('--feed-jitter', type=float, default=0.15)
+    parser.add_argument('--gemini-latency', type=float, default=0.4)
+    parser.add_argument('--gemini-jitter', type=float, default=0.2)
+    parser.add_argument('--gemini-429-rate', type=float, default=0.05)
+    parser.add_argument('--gemini-rpm', type=int, default=100000, help="client-side quota (GEMINI_RPM)")
+    parser.add_argument('--backends', default='gemini,local',
+                        help="SUMMARIZER_BACKENDS, e.g. 'local' to load-test without the Gemini stand-in")
+    parser.add_argument('--recipients', type=int, default=1000)
+    parser.add_argument('--brevo-latency', type=float, default=0.05)
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results.json'))
+    parser.add_argument('--compare', help="result file from an earlier run to diff against")
+    parser.add_argument('--verbose', action='store_true', help="show the app's own log lines")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BENCH_DIR)
+    from mock_brevo import start_mock_brevo
+    from mock_feeds import start_mock_feeds
+    from mock_gemini import start_mock_gemini
+
+    feed_server = start_mock_feeds(item_bytes=args.item_bytes, latency=args.feed_latency, jitter=args.feed_jitter,
+                                   article_bytes=args.article_bytes)
+    gemini_server = start_mock_gemini(latency=args.gemini_latency, jitter=args.gemini_jitter,
+                                      error_rate=args.gemini_429_rate)
+    brevo_server = start_mock_brevo(latency=args.brevo_latency)
+    state_dir = tempfile.mkdtemp(prefix='ai-news-bench-')
+
+    # Settings are read at import time, so the environment is set up first
+    os.environ.update({
+        'NEWS_STATE_DB': os.path.join(state_dir, 'state.db'),
+        'GEMINI_API_KEY': 'bench',
+        'GEMINI_API_URL': gemini_server.url,
+        'GEMINI_RPM': str(args.gemini_rpm),
+        'BREVO_API_KEY': 'bench',
+        'BREVO_API_URL': brevo_server.url,
+        'FEED_PER_HOST_LIMIT': str(args.per_host_limit or max(args.feeds)),
+        # Article pages share the mock's host too
+        'EXTRACT_PER_HOST_LIMIT': os.getenv('EXTRACT_CONCURRENCY', '8'),
+        'ARTICLE_EXTRACTION': '0' if args.no_extraction else '1',
+        'EXTRACT_ALLOW_PRIVATE': '1',
+        'SUMMARIZER_BACKENDS': args.backends,
+        'SENDER_EMAIL': 'bench@example.com',
+        'BENCH_RECIPIENTS': ','.join(f"reader{i}@example.com" for i in range(args.recipients))
+    })
+    imports = import_profile(dict(os.environ))
+    sys.path.insert(0, ROOT)
+    with contextlib.redirect_stderr(sys.stderr if args.verbose else io.StringIO()):
+        from api import index
+
+    scenarios = []
+    for feeds in args.feeds:
+        for items in args.items:
+            print(f"▶ {feeds} feeds x {items} items, {args.repeats} repeats...", flush=True)
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                scenario = run_scenario(index, (feed_server, gemini_server, brevo_server), feeds, items,
+                                        args, state_dir)
+            scenarios.append(scenario)
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        },
+        'imports': imports,
+        'scenarios': scenarios
+    }
+    print_table(scenarios)
+    print_imports(imports)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as previous_file:
+            print_comparison(json.load(previous_file), scenarios, imports)
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(result, output_file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()